@@ -0,0 +1,60 @@
+"""
+Therapy Robot - Pipelined audio worker
+
+The laptop controllers used to synthesise an utterance, play it to the
+end, and only then send the next TTS request, so back-to-back responses
+had a synthesis gap between them. Here a fetch thread prepares items
+(TTS request sent, audio downloading) up to `depth` ahead of the one
+playing, while the playback stage plays them strictly in queue order.
+
+prepare(item) runs on the fetch thread; play(item, prepared) runs on the
+thread that calls run(), which should be the one that owns the mixer.
+"""
+
+import queue
+import threading
+
+
+class AudioPipeline:
+    """Feeds items from a work queue through prepare -> play"""
+
+    def __init__(self, source, prepare, play, depth=2):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.source = source        # queue.Queue of items; None stops the pipeline
+        self.prepare = prepare
+        self.play = play
+        self.depth = depth
+        self._ready = queue.Queue()
+        self._slots = threading.Semaphore(depth)
+
+    def _fetch_loop(self):
+        while True:
+            # Don't run more than `depth` items ahead of playback
+            self._slots.acquire()
+            item = self.source.get()
+            if item is None:
+                self._ready.put(None)
+                return
+            try:
+                prepared = self.prepare(item)
+            except Exception as e:
+                print(f"Audio prepare error: {e}")
+                prepared = None
+            self._ready.put((item, prepared))
+
+    def run(self):
+        """Play items until a None comes through the queue"""
+        threading.Thread(target=self._fetch_loop, daemon=True).start()
+        while True:
+            entry = self._ready.get()
+            if entry is None:
+                break
+            item, prepared = entry
+            self._slots.release()   # the fetch stage may start on the next one
+            try:
+                self.play(item, prepared)
+            except Exception as e:
+                print(f"Audio Error: {e}")
+            finally:
+                self.source.task_done()
@@ -0,0 +1,160 @@
+"""
+Therapy Robot - Priority audio scheduler
+
+Replaces the laptop's unbounded FIFO audio queue. At a busy venue with
+the buttons being spammed, a FIFO keeps the robot talking for minutes
+about people who have already walked off. Instead:
+
+  - items play by priority per kind (emote before announcement before
+    roast), oldest first within a priority
+  - an item older than its kind's max age is dropped before it starts
+  - at most max_items wait; past that the lowest-priority, oldest item
+    is dropped, so memory and backlog stay bounded under load
+  - a new roast preempts older roasts that have already been waiting or
+    playing for preempt_age seconds: queued ones are dropped and ones
+    already taken by the worker get their `cancelled` event set
+
+It keeps the queue.Queue calls the audio pipeline and the tools use
+(put, get, task_done, join, qsize, unfinished_tasks). put(None) stops
+the consumer. task_done() must be called once per job in the order get()
+returned them, which is what audio_pipeline.AudioPipeline does.
+"""
+
+import itertools
+import threading
+import time
+
+
+class AudioJob:
+    __slots__ = ("kind", "data", "group", "created", "seq", "cancelled")
+
+    def __init__(self, kind, data=None, group=None, created=None):
+        self.kind = kind
+        self.data = data
+        self.group = group            # e.g. trace ID: parts of one roast share it
+        self.created = time.monotonic() if created is None else created
+        self.seq = None
+        self.cancelled = threading.Event()
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.created
+
+
+class AudioScheduler:
+    """A bounded priority queue of AudioJobs with deadlines and preemption"""
+
+    def __init__(self, priorities, max_age, max_items=8, preempt_age=None,
+                 preempt_kinds=("roast",), on_drop=None):
+        self.priorities = priorities      # kind -> priority, lower plays first
+        self.max_age = max_age            # kind -> seconds
+        self.max_items = max_items
+        self.preempt_age = preempt_age    # None = never preempt
+        self.preempt_kinds = preempt_kinds
+        self.on_drop = on_drop            # on_drop(job, reason)
+
+        self._jobs = []
+        self._in_flight = []              # taken by get(), not yet task_done()
+        self._seq = itertools.count()
+        self._stopping = False
+        self._cond = threading.Condition()
+        self.unfinished_tasks = 0
+
+        self.stats = {"queued": 0, "finished": 0, "expired": 0, "overflow": 0, "preempted": 0}
+
+    def _priority(self, job):
+        return self.priorities.get(job.kind, max(self.priorities.values(), default=0) + 1)
+
+    def _drop(self, job, reason):
+        # With self._cond held
+        self._jobs.remove(job)
+        self.stats[reason] += 1
+        self._finish()
+        if self.on_drop:
+            self.on_drop(job, reason)
+
+    def _finish(self):
+        self.unfinished_tasks -= 1
+        if self.unfinished_tasks <= 0:
+            self._cond.notify_all()
+
+    def _preempt(self, newer):
+        if self.preempt_age is None or newer.kind not in self.preempt_kinds:
+            return
+        now = time.monotonic()
+
+        def superseded(job):
+            return (job.kind in self.preempt_kinds
+                    and (job.group is None or job.group != newer.group)
+                    and job.age(now) >= self.preempt_age)
+
+        for job in [j for j in self._jobs if superseded(j)]:
+            self._drop(job, "preempted")
+        for job in self._in_flight:
+            if superseded(job) and not job.cancelled.is_set():
+                job.cancelled.set()
+                self.stats["preempted"] += 1
+
+    def put(self, job):
+        with self._cond:
+            if job is None:
+                self._stopping = True
+                self._cond.notify_all()
+                return
+            job.seq = next(self._seq)
+            self._preempt(job)
+            self._jobs.append(job)
+            self.unfinished_tasks += 1
+            self.stats["queued"] += 1
+            if len(self._jobs) > self.max_items:
+                # Lowest priority first, then the oldest
+                victim = max(self._jobs, key=lambda j: (self._priority(j), -j.seq))
+                self._drop(victim, "overflow")
+            self._cond.notify_all()
+
+    def get(self):
+        """Block for the next job to play; None once stopped"""
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                now = time.monotonic()
+                for job in [j for j in self._jobs
+                            if j.age(now) > self.max_age.get(j.kind, float("inf"))]:
+                    self._drop(job, "expired")
+                if self._jobs:
+                    job = min(self._jobs, key=lambda j: (self._priority(j), j.seq))
+                    self._jobs.remove(job)
+                    self._in_flight.append(job)
+                    return job
+                self._cond.wait()
+
+    def check(self, job):
+        """
+        Call before playing a job from get(): the reason it should be
+        skipped ("preempted" or "expired", reported to on_drop), or None
+        """
+        reason = None
+        if job.cancelled.is_set():
+            reason = "preempted"
+        elif job.age() > self.max_age.get(job.kind, float("inf")):
+            reason = "expired"
+            with self._cond:
+                self.stats["expired"] += 1
+        if reason and self.on_drop:
+            self.on_drop(job, reason)
+        return reason
+
+    def task_done(self):
+        with self._cond:
+            if self._in_flight:
+                self._in_flight.pop(0)
+            self.stats["finished"] += 1
+            self._finish()
+
+    def join(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self.unfinished_tasks <= 0)
+
+    def qsize(self):
+        with self._cond:
+            return len(self._jobs)
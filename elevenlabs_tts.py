@@ -0,0 +1,289 @@
+"""
+Therapy Robot - ElevenLabs speech for the laptop controllers
+
+Shared by laptop_audio_67.py and laptop_audio_elevenlabs.py, which keep
+only their voices, modes and serial handling. A response is split into
+sentences that are synthesised in parallel on tts_pool (tts_chunks.py),
+each served from the on-disk TTS cache when it can be (tts_cache.py),
+and played on the speech channel (playback.py), either as one continuous
+PCM stream (tts_stream.py) or clip by clip.
+
+Call init_output() on the audio thread before playing anything.
+"""
+
+import concurrent.futures
+import io
+import os
+import time
+
+import pygame
+import requests
+
+import playback
+import tts_cache
+import tts_chunks
+import tts_stream
+
+# ==================== CONFIGURATION ====================
+
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "sk_e91311b22ee997b19e3a10c7506fee71c29f19cab35d5c7e")
+ELEVENLABS_URL = "https://api.elevenlabs.io/v1/text-to-speech"
+
+# Voice settings
+STABILITY = 0.5
+SIMILARITY_BOOST = 0.75
+TTS_MODEL_ID = "eleven_monolingual_v1"
+
+# Streaming TTS: fetch raw PCM from the /stream endpoint and start
+# playing once a short jitter buffer has filled (tts_stream.py), instead
+# of waiting for the whole MP3
+STREAM_TTS = True
+STREAM_SAMPLE_RATE = 22050     # ElevenLabs output_format pcm_22050
+STREAM_JITTER_MS = 250
+
+# Pipelined playback: TTS for up to PREFETCH_DEPTH queued utterances is
+# fetched while the current one plays (audio_pipeline.py)
+PREFETCH_DEPTH = 2
+CLIP_LEAD = 0.15              # seconds before a clip ends that the next is queued behind it
+
+# Sentence-chunked TTS: responses are split into sentences that are
+# synthesised in parallel and played in order (tts_chunks.py), so speech
+# starts after the first sentence rather than the whole response.
+# Keep TTS_CONCURRENCY within the ElevenLabs plan's concurrency limit.
+TTS_SPLIT = True
+TTS_SPLIT_PATTERN = r"(?<=[.!?…])\s+"
+TTS_MIN_CHUNK_CHARS = 40      # shorter sentences are merged with the next
+TTS_CONCURRENCY = 3           # ElevenLabs requests in flight
+
+# TTS cache: generated clips are kept on disk, keyed by text, voice and
+# voice settings (tts_cache.py), so repeated lines skip the API
+TTS_CACHE = True
+TTS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+TTS_CACHE_MAX_MB = 64
+
+tts_cache_store = tts_cache.TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB * 1024 * 1024) if TTS_CACHE else None
+tts_pool = concurrent.futures.ThreadPoolExecutor(max_workers=TTS_CONCURRENCY)
+
+# Set up by init_output()
+speech_output = None
+stream_player = None
+
+
+def init_output(reserved=1):
+    """Start the mixer and the speech channel (channel 0); run on the audio thread"""
+    global speech_output, stream_player
+    if STREAM_TTS:
+        # Mixer runs at the PCM stream's format; MP3s are converted on load
+        pygame.mixer.init(frequency=STREAM_SAMPLE_RATE, size=-16, channels=1)
+    else:
+        pygame.mixer.init()
+    pygame.mixer.set_reserved(reserved)
+
+    # All speech goes through channel 0, queued back to back
+    speech_output = playback.ChannelPlayer(pygame.mixer.Channel(0))
+    stream_player = tts_stream.PCMStreamPlayer(
+        STREAM_SAMPLE_RATE, speech_output, jitter_ms=STREAM_JITTER_MS)
+
+
+# ==================== ELEVENLABS ====================
+
+def text_to_speech_elevenlabs(text, voice_id, trace=None, cancelled=None):
+    """Convert text to speech using ElevenLabs API; None on failure or cancel"""
+
+    url = f"{ELEVENLABS_URL}/{voice_id}"
+
+    headers = {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+
+    data = {
+        "text": text,
+        "model_id": TTS_MODEL_ID,
+        "voice_settings": {
+            "stability": STABILITY,
+            "similarity_boost": SIMILARITY_BOOST
+        }
+    }
+
+    try:
+        if trace:
+            trace.mark("tts_request")
+        response = requests.post(url, json=data, headers=headers, timeout=30, stream=True)
+
+        if response.status_code != 200:
+            print(f"ElevenLabs Error: {response.status_code}")
+            print(response.text)
+            return None
+
+        # Read in chunks so the trace sees the first audio byte
+        chunks = []
+        with response:
+            for chunk in response.iter_content(chunk_size=8192):
+                if cancelled is not None and cancelled.is_set():
+                    return None
+                if trace and not chunks:
+                    trace.mark("first_audio_byte")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    except Exception as e:
+        print(f"ElevenLabs Error: {e}")
+        return None
+
+
+def stream_tts_elevenlabs(text, voice_id, trace=None):
+    """Open a streaming TTS request; returns the response or None"""
+
+    url = f"{ELEVENLABS_URL}/{voice_id}/stream"
+
+    headers = {
+        "Accept": "audio/pcm",
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+
+    data = {
+        "text": text,
+        "model_id": TTS_MODEL_ID,
+        "voice_settings": {
+            "stability": STABILITY,
+            "similarity_boost": SIMILARITY_BOOST
+        }
+    }
+
+    try:
+        if trace:
+            trace.mark("tts_request")
+        response = requests.post(url, params={"output_format": f"pcm_{STREAM_SAMPLE_RATE}"},
+                                 json=data, headers=headers, timeout=30, stream=True)
+
+        if response.status_code != 200:
+            print(f"ElevenLabs Error: {response.status_code}")
+            print(response.text)
+            response.close()
+            return None
+
+        return response
+
+    except Exception as e:
+        print(f"ElevenLabs Error: {e}")
+        return None
+
+
+def tts_source(text, voice_id, trace=None, cancelled=None):
+    """
+    Audio chunks for one piece of text: from the TTS cache, or from
+    ElevenLabs (and then cached). Consumed on a tts_pool thread. Stops
+    downloading (and caches nothing) once `cancelled` is set.
+    """
+    if cancelled is not None and cancelled.is_set():
+        return
+    output_format = f"pcm_{STREAM_SAMPLE_RATE}" if STREAM_TTS else "mp3"
+    key = None
+    if TTS_CACHE:
+        key = tts_cache.cache_key(text, voice_id, TTS_MODEL_ID, STABILITY,
+                                  SIMILARITY_BOOST, output_format)
+        audio_data = tts_cache_store.get(key)
+        print_tts_cache_stats()
+        if audio_data:
+            if trace:
+                trace.info["tts_cached"] = True
+            yield audio_data
+            return
+
+    if STREAM_TTS:
+        response = stream_tts_elevenlabs(text, voice_id, trace)
+        if response is None:
+            raise IOError("no audio from ElevenLabs")
+        received = []
+        with response:
+            for chunk in response.iter_content(chunk_size=4096):
+                if cancelled is not None and cancelled.is_set():
+                    return
+                received.append(chunk)
+                yield chunk
+        audio_data = b"".join(received)
+    else:
+        audio_data = text_to_speech_elevenlabs(text, voice_id, trace, cancelled)
+        if cancelled is not None and cancelled.is_set():
+            return
+        if not audio_data:
+            raise IOError("no audio from ElevenLabs")
+        yield audio_data
+
+    if key:
+        tts_cache_store.put(key, audio_data)
+
+
+def print_tts_cache_stats():
+    stats = tts_cache_store.stats()
+    print(f"   TTS cache: {stats['hits']} hits / {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%}), {stats['bytes_saved'] // 1024} KB saved, "
+          f"{stats['entries']} clips, {stats['bytes'] / 1e6:.1f} MB")
+
+
+# ==================== PLAYBACK ====================
+
+def prepare_tts(text, voice_id, trace=None, cancelled=None):
+    """Fetch stage: start synthesising one utterance, sentence by sentence"""
+    if TTS_SPLIT:
+        sentences = tts_chunks.split_sentences(text, TTS_SPLIT_PATTERN, TTS_MIN_CHUNK_CHARS)
+    else:
+        sentences = [text]
+
+    def fetch(index, sentence):
+        return tts_source(sentence, voice_id, trace if index == 0 else None, cancelled)
+
+    return tts_chunks.ChunkedSynthesis(sentences or [text], fetch, tts_pool, trace)
+
+
+def play_tts_audio(audio_data, trace=None, cancelled=None):
+    """Play TTS audio data using pygame"""
+
+    # Decoded straight from memory; the next clip is queued behind this
+    # one CLIP_LEAD seconds before it ends, so there's no gap
+    sound = pygame.mixer.Sound(file=io.BytesIO(audio_data))
+    started = speech_output.submit(sound, cancelled)
+    if started is None:
+        return
+    if trace:
+        trace.mark("playback_start", playback.to_wall(started))
+    speech_output.wait(cancelled, lead=CLIP_LEAD)
+
+
+def play_prepared_tts(synthesis, trace=None, cancelled=None):
+    """Playback stage: play the sentences prepare_tts() started, in order"""
+    if synthesis is None:
+        return False
+
+    if STREAM_TTS:
+        # One continuous stream, so there is no gap between sentences
+        stats = stream_player.play(synthesis.chunks(), trace, cancelled, lead=CLIP_LEAD)
+        print(f"   Stream: {stats}")
+        if stats.error:
+            print(f"   Stream error: {stats.error}")
+        played = stats.bytes > 0
+    else:
+        played = False
+        for part in synthesis:
+            if cancelled is not None and cancelled.is_set():
+                break
+            part.wait()
+            if part.complete:
+                play_tts_audio(part.data(), trace, cancelled)
+                played = True
+
+    print(f"   TTS sentences: {synthesis.summary()}")
+    if trace:
+        trace.info["tts_sentences"] = synthesis.timings()
+    return played
+
+
+def finish_trace(trace, trace_log):
+    if trace:
+        # Playback may still be finishing its last CLIP_LEAD seconds
+        ends_at = max(speech_output.ends_at, time.monotonic())
+        trace.mark("playback_end", playback.to_wall(ends_at))
+        trace_log.write(trace)
@@ -19,11 +19,29 @@ import threading
 import queue
 import sys
 import time
+import os
+
+import link_protocol
+import serial_record
+import tracing
+from serial_lines import LineReader
 
 # ==================== CONFIGURATION ====================
 
 BAUD_RATE = 115200
 
+# ROAST tracing: responses from the Pi carry a trace ID; the stages seen
+# here are appended to TRACE_LOG (merge with tools/trace_report.py)
+TRACING = True
+TRACE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trace_laptop.jsonl")
+
+trace_log = tracing.TraceLog(TRACE_LOG) if TRACING else None
+
+# Session recording: every raw byte from the gateway is logged with its
+# arrival time to SESSION_DIR, for tools/replay_session.py
+RECORD_SESSION = False
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+
 # ==================== FIND ESP32 ====================
 
 def find_esp32_port():
@@ -58,12 +76,18 @@ def tts_worker():
     
     while True:
         try:
-            text = speech_queue.get(timeout=1)
-            if text is None:  # Shutdown signal
+            item = speech_queue.get(timeout=1)
+            if item is None:  # Shutdown signal
                 break
+            text, trace = item
             print(f"\n🔊 Speaking: {text}\n")
+            if trace:
+                trace.mark("playback_start")
             engine.say(text)
             engine.runAndWait()
+            if trace:
+                trace.mark("playback_end")
+                trace_log.write(trace)
             speech_queue.task_done()
         except queue.Empty:
             continue
@@ -79,9 +103,9 @@ def init_tts():
     print("TTS ready!")
 
 
-def speak(text):
+def speak(text, trace=None):
     """Queue text for speech (non-blocking)"""
-    speech_queue.put(text)
+    speech_queue.put((text, trace))
 
 
 # ==================== SERIAL HANDLING ====================
@@ -113,10 +137,31 @@ def is_garbage(line):
     return False
 
 
+# Compressed responses need the same dictionary as the Pi (link_dict.bin)
+reassembler = link_protocol.Reassembler(compressor=link_protocol.load_compressor())
+
+def handle_message(msg):
+    """Process a complete framed message from the Pi"""
+    print(f"📥 {msg.text}")
+    
+    if msg.type == link_protocol.TYPE_MODE:
+        mode = msg.text.split(":", 1)[-1].strip()
+        speak(f"Switched to {mode} mode")
+    elif msg.type == link_protocol.TYPE_RESPONSE:
+        trace = None
+        if TRACING and msg.trace:
+            trace = tracing.Trace(msg.trace, side="laptop")
+            trace.mark("receive")
+        speak(msg.text, trace)
+
+
 def handle_line(line):
     """Process incoming serial data"""
-    line = line.strip()
-    
+    # Framed messages from the Pi (possibly split over several lines) go
+    # to the reassembler unstripped; other lines come back stripped
+    messages, line = reassembler.route(line)
+    for msg in messages:
+        handle_message(msg)
     if not line:
         return
     
@@ -181,19 +226,26 @@ def main():
     
     speak("Robot audio ready")
     
-    # Main loop
+    recorder = None
+    if RECORD_SESSION:
+        recorder = serial_record.SessionRecorder(serial_record.session_path(SESSION_DIR))
+        print(f"Recording session to {recorder.path}")
+    
+    # Main loop - blocks until the port has data, no polling
+    reader = LineReader(ser, recorder=recorder)
     try:
         while True:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', errors='ignore')
+            for line in reader.read_lines(timeout=1.0):
                 handle_line(line)
-            time.sleep(0.01)
     
     except KeyboardInterrupt:
         print("\nShutting down...")
         speech_queue.put(None)  # Signal TTS thread to stop
     finally:
         ser.close()
+        if recorder:
+            recorder.close()
+            print(f"Recorded {recorder.bytes} bytes in {recorder.chunks} reads")
 
 
 if __name__ == "__main__":
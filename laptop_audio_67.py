@@ -22,21 +22,25 @@ Run:
 
 import serial
 import serial.tools.list_ports
-import requests
 import pygame
 import threading
-import queue
 import sys
 import time
 import os
-import tempfile
+
+import audio_pipeline
+import audio_scheduler
+import elevenlabs_tts
+import link_protocol
+import serial_record
+import sound_bank
+import tracing
+from serial_lines import LineReader
 
 # ==================== CONFIGURATION ====================
 
 BAUD_RATE = 115200
 
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "sk_e91311b22ee997b19e3a10c7506fee71c29f19cab35d5c7e")
-
 # 67 Emote audio file - change this to your file path
 EMOTE_67_AUDIO = "67_emote.mp3"  # Put your audio file in same folder
 
@@ -50,9 +54,39 @@ VOICES = {
 current_mode = "evil"
 current_voice = VOICES["adam"]
 
-# Voice settings
-STABILITY = 0.5
-SIMILARITY_BOOST = 0.75
+# Voice settings, streaming, the TTS cache and sentence chunking are
+# configured in elevenlabs_tts.py
+
+# Audio scheduling (audio_scheduler.py): jobs play by priority (lower
+# first) and are dropped once older than their max age, so a backlog at a
+# busy venue doesn't keep the robot talking about people who have left.
+# At most AUDIO_QUEUE_MAX wait. A new roast cuts short older roasts that
+# have been waiting or playing for ROAST_PREEMPT_AGE seconds.
+AUDIO_PRIORITIES = {"emote": 0, "announce": 1, "roast": 2}
+AUDIO_MAX_AGE = {"emote": 5.0, "announce": 15.0, "roast": 45.0}
+AUDIO_QUEUE_MAX = 6
+ROAST_PREEMPT_AGE = 20.0      # None = never cut a roast short
+ANNOUNCE_MODE = False         # speak "Evil mode." / "Therapy mode." on a switch
+
+# Sound bank: local effects are decoded into memory once at startup and
+# played on mixer channels of their own (sound_bank.py), so an emote
+# starts at once instead of waiting behind speech. Speech is ducked to
+# DUCK_VOLUME while an effect plays (1.0 = no ducking).
+SOUND_BANK = True
+EFFECT_CHANNELS = 2           # mixer channels 1..N; channel 0 is speech
+DUCK_VOLUME = 0.4
+
+# ROAST tracing: responses from the Pi carry a trace ID; the stages seen
+# here are appended to TRACE_LOG (merge with tools/trace_report.py)
+TRACING = True
+TRACE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trace_laptop.jsonl")
+
+trace_log = tracing.TraceLog(TRACE_LOG) if TRACING else None
+
+# Session recording: every raw byte from the gateway is logged with its
+# arrival time to SESSION_DIR, for tools/replay_session.py
+RECORD_SESSION = False
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
 
 # ==================== FIND ESP32 ====================
 
@@ -77,8 +111,20 @@ def find_esp32_port():
 
 # ==================== AUDIO PLAYBACK ====================
 
-audio_queue = queue.Queue()
+def audio_dropped(job, reason):
+    """The scheduler won't play this job: say so and close its trace"""
+    print(f"⏭️  Dropped {job.kind} ({reason}, {job.age():.1f} s old)")
+    trace = job.data[2] if job.data else None
+    if trace:
+        trace.info["dropped"] = reason
+        trace_log.write(trace)
+
+
+audio_queue = audio_scheduler.AudioScheduler(
+    AUDIO_PRIORITIES, AUDIO_MAX_AGE, max_items=AUDIO_QUEUE_MAX,
+    preempt_age=ROAST_PREEMPT_AGE, on_drop=audio_dropped)
 audio_thread = None
+effects = None
 
 def play_local_audio(filepath):
     """Play a local audio file"""
@@ -87,103 +133,68 @@ def play_local_audio(filepath):
         return False
     
     try:
-        pygame.mixer.music.load(filepath)
-        pygame.mixer.music.play()
-        
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
+        elevenlabs_tts.speech_output.submit(pygame.mixer.Sound(filepath))
+        elevenlabs_tts.speech_output.wait()
         return True
     except Exception as e:
         print(f"Error playing audio: {e}")
         return False
 
 
-def text_to_speech_elevenlabs(text, voice_id):
-    """Convert text to speech using ElevenLabs API"""
-    
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": ELEVENLABS_API_KEY
-    }
-    
-    data = {
-        "text": text,
-        "model_id": "eleven_monolingual_v1",
-        "voice_settings": {
-            "stability": STABILITY,
-            "similarity_boost": SIMILARITY_BOOST
-        }
-    }
-    
-    try:
-        response = requests.post(url, json=data, headers=headers, timeout=30)
-        
-        if response.status_code != 200:
-            print(f"ElevenLabs Error: {response.status_code}")
-            print(response.text)
-            return None
-        
-        return response.content
-    
-    except Exception as e:
-        print(f"ElevenLabs Error: {e}")
-        return None
+def prepare_audio_item(job):
+    """Fetch stage: runs ahead of playback"""
+    if job.data and not job.cancelled.is_set():
+        text, voice_id, trace = job.data
+        return elevenlabs_tts.prepare_tts(text, voice_id, trace, job.cancelled)
+    return None
 
 
-def play_tts_audio(audio_data):
-    """Play TTS audio data using pygame"""
+def play_audio_item(job, prepared):
+    """Playback stage: jobs play in the order the scheduler gave them"""
+    if audio_queue.check(job):
+        return
     
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-        f.write(audio_data)
-        temp_path = f.name
+    if job.kind == "emote":
+        print(f"\n🎵 Playing 67 emote audio...\n")
+        play_local_audio(EMOTE_67_AUDIO)
     
-    try:
-        pygame.mixer.music.load(temp_path)
-        pygame.mixer.music.play()
+    else:
+        text, voice_id, trace = job.data
+        voice_name = "Adam" if voice_id == VOICES["adam"] else "Sarah"
+        print(f"\n🔊 [{voice_name}]: {text}\n")
         
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
-    finally:
-        os.unlink(temp_path)
+        if not elevenlabs_tts.play_prepared_tts(prepared, trace, job.cancelled):
+            print("   Failed to generate audio")
+        if job.cancelled.is_set():
+            print("   ⏭️  Cut short by a newer roast")
+            if trace:
+                trace.info["cut_short"] = True
+        elevenlabs_tts.finish_trace(trace, trace_log)
+
+
+def load_sound_bank():
+    """Decode the local effects into memory"""
+    bank = sound_bank.SoundBank(
+        [pygame.mixer.Channel(1 + i) for i in range(EFFECT_CHANNELS)],
+        duck=[pygame.mixer.Channel(0)], duck_volume=DUCK_VOLUME)
+    bank.load("emote_67", EMOTE_67_AUDIO)
+    return bank
 
 
 def audio_worker():
     """Background thread that handles all audio"""
     
-    pygame.mixer.init()
-    
-    while True:
-        try:
-            item = audio_queue.get(timeout=1)
-            if item is None:
-                break
-            
-            audio_type, data = item
-            
-            if audio_type == "emote_67":
-                print(f"\n🎵 Playing 67 emote audio...\n")
-                play_local_audio(EMOTE_67_AUDIO)
-            
-            elif audio_type == "tts":
-                text, voice_id = data
-                voice_name = "Adam" if voice_id == VOICES["adam"] else "Sarah"
-                print(f"\n🔊 [{voice_name}]: {text}\n")
-                
-                audio_data = text_to_speech_elevenlabs(text, voice_id)
-                if audio_data:
-                    play_tts_audio(audio_data)
-                else:
-                    print("   Failed to generate audio")
-            
-            audio_queue.task_done()
-        
-        except queue.Empty:
-            continue
-        except Exception as e:
-            print(f"Audio Error: {e}")
+    global effects
+    # Channel 0 is speech, the next EFFECT_CHANNELS are the sound bank's
+    elevenlabs_tts.init_output(reserved=1 + EFFECT_CHANNELS)
+    
+    if SOUND_BANK:
+        effects = load_sound_bank()
+    
+    # TTS for the next items is fetched while the current one plays
+    pipeline = audio_pipeline.AudioPipeline(
+        audio_queue, prepare_audio_item, play_audio_item, depth=elevenlabs_tts.PREFETCH_DEPTH)
+    pipeline.run()
 
 
 def init_audio():
@@ -194,14 +205,17 @@ def init_audio():
     print("Audio ready!")
 
 
-def speak(text):
-    """Queue text for TTS"""
-    audio_queue.put(("tts", (text, current_voice)))
+def speak(text, trace=None, kind="roast", group=None):
+    """Queue text for TTS; `group` ties together the parts of one roast"""
+    audio_queue.put(audio_scheduler.AudioJob(kind, (text, current_voice, trace), group))
 
 
 def play_emote_67():
-    """Queue 67 emote audio"""
-    audio_queue.put(("emote_67", None))
+    """Play 67 emote audio now from the sound bank (queued if it isn't loaded)"""
+    if effects and effects.play("emote_67"):
+        print(f"\n🎵 Playing 67 emote audio...\n")
+        return
+    audio_queue.put(audio_scheduler.AudioJob("emote"))
 
 
 # ==================== MODE SWITCHING ====================
@@ -220,6 +234,11 @@ def set_mode(mode):
         current_mode = "therapy"
         current_voice = VOICES["sarah"]
         print("🟢 Mode: THERAPY (Voice: Sarah)")
+    else:
+        return
+    
+    if ANNOUNCE_MODE:
+        speak(f"{current_mode.capitalize()} mode.", kind="announce")
 
 
 # ==================== SERIAL HANDLING ====================
@@ -246,10 +265,32 @@ def is_ai_response(line):
     return True
 
 
+# Compressed responses need the same dictionary as the Pi (link_dict.bin)
+reassembler = link_protocol.Reassembler(compressor=link_protocol.load_compressor())
+
+def handle_message(msg):
+    """Process a complete framed message from the Pi"""
+    print(f"📥 {msg.text}")
+    
+    if msg.type == link_protocol.TYPE_MODE:
+        set_mode(msg.text.split(":", 1)[-1].strip())
+    elif msg.type == link_protocol.TYPE_RESPONSE:
+        trace = None
+        if TRACING and msg.trace:
+            trace = tracing.Trace(msg.trace, side="laptop")
+            trace.mark("receive")
+        # Sentences of one roast share its trace ID (sent even with Pi
+        # tracing off); without one, each message is its own group
+        speak(msg.text, trace, group=msg.trace or f"msg-{msg.id:04x}")
+
+
 def handle_line(line):
     """Process incoming serial data"""
-    line = line.strip()
-    
+    # Framed messages from the Pi (possibly split over several lines) go
+    # to the reassembler unstripped; other lines come back stripped
+    messages, line = reassembler.route(line)
+    for msg in messages:
+        handle_message(msg)
     if not line:
         return
     
@@ -277,7 +318,7 @@ def main():
     global current_mode, current_voice
     
     # Check API key
-    if ELEVENLABS_API_KEY == "your-key-here":
+    if elevenlabs_tts.ELEVENLABS_API_KEY == "your-key-here":
         print()
         print("=" * 50)
         print("ERROR: Set your ElevenLabs API key!")
@@ -341,19 +382,26 @@ def main():
     print("=" * 50)
     print()
     
-    # Main loop
+    recorder = None
+    if RECORD_SESSION:
+        recorder = serial_record.SessionRecorder(serial_record.session_path(SESSION_DIR))
+        print(f"Recording session to {recorder.path}")
+    
+    # Main loop - blocks until the port has data, no polling
+    reader = LineReader(ser, recorder=recorder)
     try:
         while True:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', errors='ignore')
+            for line in reader.read_lines(timeout=1.0):
                 handle_line(line)
-            time.sleep(0.01)
     
     except KeyboardInterrupt:
         print("\nShutting down...")
         audio_queue.put(None)
     finally:
         ser.close()
+        if recorder:
+            recorder.close()
+            print(f"Recorded {recorder.bytes} bytes in {recorder.chunks} reads")
         pygame.mixer.quit()
 
 
@@ -0,0 +1,348 @@
+"""
+Therapy Robot - Framed link protocol (Pi -> ESP32 -> ESP-NOW -> laptop)
+
+Every line the Pi sends ends up in a 245-byte ESP-NOW Message on the
+robot ESP32, so anything longer than 244 bytes used to be cut off. This
+codec frames each message with a type, message ID, sequence number and
+checksum, splits long messages into fragments that fit one ESP-NOW
+frame, and reassembles them on the laptop with a timeout and duplicate
+suppression.
+
+Frame layout (one line, ASCII header + UTF-8 payload):
+
+    @@ T IIII SS NN CCCC : payload
+       | |    |  |  |
+       | |    |  |  +-- CRC-16/CCITT of the header fields + payload (hex)
+       | |    |  +----- total fragments (hex)
+       | |    +-------- fragment number, from 0 (hex)
+       | +------------- message ID (hex)
+       +--------------- message type (one letter)
+
+CR and LF in a message become spaces before framing, since either would
+split the frame on the wire.
+
+Lines that don't start with the frame marker (ESP32 debug output,
+"EMOTE 67 DONE") pass through untouched.
+
+Compression: with a Compressor, a message is deflated against a preset
+dictionary of phrases our responses use, Base85-encoded (the link is
+line-based text) and sent with a lowercase message type. It is only
+used when it makes the message shorter. The first payload byte is a
+dictionary ID so a laptop with a different dictionary drops the message
+instead of speaking garbage. Build a dictionary from logged responses
+with tools/build_link_dict.py.
+"""
+
+import base64
+import binascii
+import collections
+import os
+import random
+import threading
+import time
+import zlib
+
+MARKER = "@@"
+HEADER_LEN = len(MARKER) + 1 + 4 + 2 + 2 + 4 + 1
+MAX_LINE_BYTES = 244                    # ESP-NOW Message.command is char[245]
+MAX_PAYLOAD_BYTES = MAX_LINE_BYTES - HEADER_LEN
+MAX_FRAGMENTS = 0xFF
+
+# Message types
+TYPE_RESPONSE = "R"   # AI response text
+TYPE_MODE = "M"       # mode change ("MODE:evil")
+TYPE_STATUS = "S"     # anything else worth showing
+TYPE_TRACED = "T"     # AI response with a trace ID: "<8 hex>:" + text
+
+
+# Preset dictionary shared by both ends (written by tools/build_link_dict.py)
+DICT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "link_dict.bin")
+
+# Used when DICT_FILE doesn't exist: phrases common to both modes.
+# zlib finds matches near the end of the dictionary cheapest, so the
+# most common phrases go last.
+DEFAULT_DICTIONARY = (
+    "honestly, absolutely, definitely, probably, literally, actually "
+    "Think of it as  Keep going  Remember that  It's okay to  you deserve "
+    "take a deep breath  be gentle with yourself  you're doing great "
+    "warm  calm  kind  brave  strong  proud  supportive  energy  vibe "
+    "haircut  hair  outfit  shirt  hoodie  sweater  glasses  beard  smile "
+    "face  eyes  expression  look like  looks like  dressed like "
+    "I can see  I can tell  I love  I'm here  I'm sure  I think "
+    "your confidence  your style  your smile  your energy  your face "
+    "someone who  the kind of person who  like you  that you "
+    "You look like  You've got  You have  You're  Your  You "
+    "It's  That's  This is  There's  with a  in the  of the  and the "
+    "is a  is the  that  this  just  really  even  because  about  "
+).encode("utf-8")
+
+
+class FrameError(ValueError):
+    """A line looked like a frame but couldn't be parsed"""
+
+
+class MessageTooLong(ValueError):
+    """A message needs more than MAX_FRAGMENTS fragments"""
+
+
+class Compressor:
+    """Raw deflate against a preset dictionary, Base85 on the wire"""
+
+    def __init__(self, zdict=DEFAULT_DICTIONARY, level=9):
+        self.zdict = bytes(zdict)
+        self.level = level
+        self.dict_id = zlib.crc32(self.zdict) & 0xFF
+
+    def compress(self, data):
+        """bytes -> ASCII bytes safe to send on a line"""
+        # Raw deflate (negative wbits): no zlib header or checksum, the
+        # frame CRC already covers the payload
+        comp = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9,
+                                zlib.Z_DEFAULT_STRATEGY, self.zdict)
+        packed = bytes([self.dict_id]) + comp.compress(data) + comp.flush()
+        return base64.b85encode(packed)
+
+    def decompress(self, payload):
+        try:
+            packed = base64.b85decode(payload)
+        except ValueError:
+            raise FrameError("bad base85 payload")
+        if not packed or packed[0] != self.dict_id:
+            raise FrameError("compressed with a different dictionary")
+        decomp = zlib.decompressobj(-15, self.zdict)
+        try:
+            return decomp.decompress(packed[1:]) + decomp.flush()
+        except zlib.error as e:
+            raise FrameError(f"inflate failed: {e}")
+
+
+def load_compressor(path=DICT_FILE, level=9):
+    """Compressor using the dictionary at `path`, or the built-in one"""
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            zdict = f.read()
+        print(f"Link dictionary: {path} ({len(zdict)} bytes)")
+        return Compressor(zdict, level)
+    return Compressor(DEFAULT_DICTIONARY, level)
+
+
+def _checksum(header_fields, payload_bytes):
+    return binascii.crc_hqx(header_fields.encode("ascii") + payload_bytes, 0xFFFF)
+
+
+def one_line(text):
+    """Text with CR/LF turned into spaces: the link is line-based, and the
+    robot ESP32 drops every CR"""
+    return " ".join(text.replace("\r\n", "\n").replace("\r", "\n").split("\n"))
+
+
+def split_utf8(data, size):
+    """Split bytes into chunks of at most `size` without breaking a character"""
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = min(start + size, len(data))
+        # Back up over UTF-8 continuation bytes (10xxxxxx)
+        while end < len(data) and end > start and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        chunks.append(data[start:end])
+        start = end
+    return chunks or [b""]
+
+
+def encode_frame(msg_type, msg_id, seq, total, payload_bytes):
+    fields = f"{msg_type}{msg_id:04x}{seq:02x}{total:02x}"
+    crc = _checksum(fields, payload_bytes)
+    return f"{MARKER}{fields}{crc:04x}:".encode("ascii") + payload_bytes
+
+
+def is_frame(line):
+    return line.startswith(MARKER)
+
+
+def decode_frame(line):
+    """Parse one frame line into (type, msg_id, seq, total, payload_bytes)"""
+    raw = line.encode("utf-8") if isinstance(line, str) else line
+    if len(raw) < HEADER_LEN or raw[HEADER_LEN - 1:HEADER_LEN] != b":":
+        raise FrameError("short or malformed header")
+    try:
+        header = raw[len(MARKER):HEADER_LEN - 1].decode("ascii")
+        msg_type = header[0]
+        msg_id = int(header[1:5], 16)
+        seq = int(header[5:7], 16)
+        total = int(header[7:9], 16)
+        crc = int(header[9:13], 16)
+    except (UnicodeDecodeError, ValueError):
+        raise FrameError("bad header")
+
+    payload = raw[HEADER_LEN:]
+    if _checksum(header[:9], payload) != crc:
+        raise FrameError("checksum mismatch")
+    if total == 0 or seq >= total:
+        raise FrameError("bad sequence")
+    return msg_type, msg_id, seq, total, payload
+
+
+class Encoder:
+    """Pi side: turns messages into frame lines"""
+
+    def __init__(self, max_payload=MAX_PAYLOAD_BYTES, compressor=None):
+        self.max_payload = max_payload
+        self.compressor = compressor
+        # Random start so IDs don't collide with a previous run's
+        self._next_id = random.randrange(0x10000)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            msg_id = self._next_id
+            self._next_id = (self._next_id + 1) & 0xFFFF
+            return msg_id
+
+    def encode(self, text, msg_type=TYPE_RESPONSE, msg_id=None, trace_id=None):
+        """Return the list of frame lines (bytes, no newline) for a message"""
+        if msg_id is None:
+            msg_id = self.next_id()
+        text = one_line(text)
+        if trace_id and msg_type == TYPE_RESPONSE:
+            text = f"{trace_id}:{text}"
+            msg_type = TYPE_TRACED
+        data = text.encode("utf-8")
+        if self.compressor is not None:
+            packed = self.compressor.compress(data)
+            if len(packed) < len(data):
+                data = packed
+                msg_type = msg_type.lower()
+        chunks = split_utf8(data, self.max_payload)
+        if len(chunks) > MAX_FRAGMENTS:
+            # Cutting it short would leave the laptop waiting for fragments
+            # that never come (or splice a corrupt compressed message)
+            raise MessageTooLong(f"{len(data)} bytes needs {len(chunks)} fragments, "
+                                 f"max {MAX_FRAGMENTS}")
+        total = len(chunks)
+        return [encode_frame(msg_type, msg_id, seq, total, chunk)
+                for seq, chunk in enumerate(chunks)]
+
+
+class Message:
+    __slots__ = ("type", "id", "text", "trace")
+
+    def __init__(self, msg_type, msg_id, text, trace=None):
+        self.type = msg_type
+        self.id = msg_id
+        self.text = text
+        self.trace = trace  # trace ID of a TYPE_TRACED response
+
+    def __repr__(self):
+        return f"Message({self.type}, {self.id:04x}, {self.text!r})"
+
+
+class _Pending:
+    __slots__ = ("type", "total", "parts", "first_seen")
+
+    def __init__(self, msg_type, total):
+        self.type = msg_type
+        self.total = total
+        self.parts = {}
+        self.first_seen = time.monotonic()
+
+
+class Reassembler:
+    """Laptop side: collects fragments back into messages"""
+
+    def __init__(self, timeout=5.0, remember=128, compressor=None):
+        self.timeout = timeout
+        self.compressor = compressor
+        self._pending = {}
+        self._done = collections.OrderedDict()  # recently completed IDs
+        self._remember = remember
+
+        self.completed = 0
+        self.duplicates = 0
+        self.corrupt = 0
+        self.timed_out = 0
+        self.compressed = 0
+
+    def expire(self):
+        """Drop incomplete messages older than the timeout"""
+        now = time.monotonic()
+        for key, pending in list(self._pending.items()):
+            if now - pending.first_seen > self.timeout:
+                del self._pending[key]
+                msg_id = key[1]
+                self.timed_out += 1
+                print(f"   [link] message {msg_id:04x} timed out "
+                      f"({len(pending.parts)}/{pending.total} fragments)")
+
+    def route(self, line):
+        """
+        Sort one line from serial_lines.LineReader: returns (messages,
+        text) where messages are any Messages a frame completed and text
+        is a plain (non-frame) line, stripped, or None.
+
+        Frames are fed exactly as read: a fragment boundary can fall next
+        to a space, and stripping it would break the checksum.
+        """
+        if is_frame(line):
+            return self.feed(line), None
+        return [], line.strip() or None
+
+    def feed(self, line):
+        """Feed one frame line; returns a list of completed Messages"""
+        self.expire()
+        try:
+            msg_type, msg_id, seq, total, payload = decode_frame(line)
+        except FrameError as e:
+            self.corrupt += 1
+            print(f"   [link] dropped frame: {e}")
+            return []
+
+        key = (msg_type, msg_id)
+        if key in self._done:
+            self.duplicates += 1
+            return []
+
+        pending = self._pending.get(key)
+        if pending is None or pending.total != total:
+            pending = self._pending[key] = _Pending(msg_type, total)
+        if seq in pending.parts:
+            self.duplicates += 1
+            return []
+        pending.parts[seq] = payload
+
+        if len(pending.parts) < total:
+            return []
+
+        del self._pending[key]
+        self._done[key] = True
+        while len(self._done) > self._remember:
+            self._done.popitem(last=False)
+
+        data = b"".join(pending.parts[i] for i in range(total))
+        if msg_type.islower():
+            try:
+                if self.compressor is None:
+                    raise FrameError("compressed message but no dictionary")
+                data = self.compressor.decompress(data)
+            except FrameError as e:
+                self.corrupt += 1
+                print(f"   [link] dropped message {msg_id:04x}: {e}")
+                return []
+            msg_type = msg_type.upper()
+            self.compressed += 1
+        self.completed += 1
+        text = data.decode("utf-8", errors="replace")
+        if msg_type == TYPE_TRACED:
+            trace, _, text = text.partition(":")
+            return [Message(TYPE_RESPONSE, msg_id, text, trace)]
+        return [Message(msg_type, msg_id, text)]
+
+    def stats(self):
+        return {
+            "completed": self.completed,
+            "pending": len(self._pending),
+            "duplicates": self.duplicates,
+            "corrupt": self.corrupt,
+            "timed_out": self.timed_out,
+            "compressed": self.compressed,
+        }
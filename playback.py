@@ -0,0 +1,107 @@
+"""
+Therapy Robot - Gapless speech channel
+
+Every playback path used to end with
+
+    while pygame.mixer.music.get_busy():
+        time.sleep(0.1)
+
+which left up to 100 ms of dead air after each clip and woke the thread
+ten times a second for nothing. ChannelPlayer instead keeps track of
+when each Sound on its channel will end (Sound.get_length()) and sleeps
+until exactly then, on a threading.Event so a cancel wakes it at once.
+The next clip goes into the channel's queue while the current one is
+still playing, so back-to-back clips start with no gap.
+
+(pygame's own end events arrive through the display event queue, which
+the audio worker thread can't own; timers on known clip lengths give
+the same wake-ups without it.)
+"""
+
+import collections
+import threading
+import time
+
+QUEUE_RECHECK = 0.005     # mixer start latency: retry queue() this often
+
+
+def to_wall(monotonic_time):
+    """A time.monotonic() stamp as time.time(), for traces"""
+    return time.time() + (monotonic_time - time.monotonic())
+
+
+def wait(cancelled, seconds):
+    """Sleep `seconds`; returns True at once if `cancelled` gets set"""
+    if cancelled is not None:
+        return cancelled.wait(max(0.0, seconds)) if seconds > 0 else cancelled.is_set()
+    if seconds > 0:
+        time.sleep(seconds)
+    return False
+
+
+class ChannelPlayer:
+    """Plays Sounds back to back on one mixer channel without polling"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._ends = collections.deque()   # monotonic end time of each sound on the channel
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._ends and self._ends[0] <= now:
+            self._ends.popleft()
+
+    @property
+    def ends_at(self):
+        """When everything submitted so far will have played (monotonic), 0 if idle"""
+        with self._lock:
+            self._prune(time.monotonic())
+            return self._ends[-1] if self._ends else 0.0
+
+    def idle(self):
+        return self.ends_at == 0.0
+
+    def submit(self, sound, cancelled=None):
+        """
+        Start `sound` now, or straight after what is already playing.
+        Blocks while the channel's one-sound queue is full. Returns the
+        monotonic start time, or None if cancelled while waiting.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                # The channel decides play vs queue: the estimated ends
+                # ignore mixer output latency, so a clip can still be
+                # audible after its entry has been pruned
+                if self.channel.get_queue() is None:
+                    if self.channel.get_busy():
+                        self.channel.queue(sound)
+                        start = max(self._ends[-1], now) if self._ends else now
+                    else:
+                        self._ends.clear()
+                        self.channel.play(sound)
+                        start = now
+                    self._ends.append(start + sound.get_length())
+                    return start
+                # One playing and one queued: the slot frees when the first ends
+                delay = self._ends[0] - now if len(self._ends) >= 2 else QUEUE_RECHECK
+            if wait(cancelled, max(delay, QUEUE_RECHECK)):
+                return None
+
+    def wait(self, cancelled=None, lead=0.0):
+        """
+        Block until everything submitted has played, or `lead` seconds
+        before that so the caller can queue the next clip behind it.
+        Stops the channel if cancelled. Returns the monotonic end time.
+        """
+        end = self.ends_at
+        if wait(cancelled, end - lead - time.monotonic()):
+            self.stop()
+            return time.monotonic()
+        return max(end, time.monotonic()) if end else time.monotonic()
+
+    def stop(self):
+        with self._lock:
+            self.channel.stop()
+            self._ends.clear()
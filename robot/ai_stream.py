@@ -0,0 +1,85 @@
+"""
+Therapy Robot - Streaming completion helpers
+
+Parses the OpenRouter / OpenAI chat-completions SSE stream and cuts the
+token stream into sentences so each one can be sent to the ESP32 as soon
+as it is complete.
+"""
+
+import json
+import re
+
+# End of sentence: terminal punctuation, optional closing quotes/brackets,
+# then whitespace
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+
+# Words that end in a period but don't end a sentence
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "etc.", "e.g.", "i.e."}
+
+
+class StreamError(Exception):
+    """The API reported an error inside the stream"""
+
+
+def iter_sse_deltas(response):
+    """Yield content deltas from a streaming chat-completions response"""
+    for raw in response.iter_lines():
+        if not raw:
+            continue
+        line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+        # Lines starting with ':' are SSE comments (OpenRouter keep-alives)
+        if line.startswith(":") or not line.startswith("data:"):
+            continue
+
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise StreamError(chunk["error"].get("message", chunk["error"]))
+
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        text = (choices[0].get("delta") or {}).get("content")
+        if text:
+            yield text
+
+
+class SentenceSplitter:
+    """
+    Accumulates streamed text and hands back whole sentences.
+
+    Sentences shorter than `min_chars` are held and merged with the next
+    one, so the laptop's length filter doesn't drop them.
+    """
+
+    def __init__(self, min_chars=25):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add streamed text; returns a list of completed sentences"""
+        # The serial link is line based, so newlines become spaces
+        self._buffer += text.replace("\r", " ").replace("\n", " ")
+
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            end = match.end()
+            candidate = self._buffer[start:end].strip()
+            last_word = candidate.rsplit(" ", 1)[-1].lower()
+            if last_word in ABBREVIATIONS or len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = end
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever is left once the stream ends"""
+        rest = " ".join(self._buffer.split())
+        self._buffer = ""
+        return rest
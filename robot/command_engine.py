@@ -0,0 +1,183 @@
+"""
+Therapy Robot - Asyncio command engine
+
+Reads commands from the UART without blocking on slow work. Instant
+commands (TOGGLE) run straight away on the event loop; slow commands
+(ROAST) run as jobs in a worker thread. A repeated job command while one
+is in flight either joins it or cancels and restarts it, and a job that
+has been superseded can no longer write to the serial link.
+"""
+
+import asyncio
+import threading
+import time
+
+import link_protocol
+from serial_lines import LineReader
+
+# What to do with a repeated job command while one is in flight
+POLICY_JOIN = "join"        # ignore the repeat, the running job answers it
+POLICY_RESTART = "restart"  # cancel the running job and start a new one
+
+
+class SerialWriter:
+    """
+    Thread-safe line writer for the serial port.
+
+    With an encoder, each message is sent as link_protocol frames (split
+    into fragments if it wouldn't fit one ESP-NOW packet).
+    """
+
+    def __init__(self, ser, encoder=None):
+        self.ser = ser
+        self.encoder = encoder
+        self.lock = threading.RLock()
+
+    def write_line(self, text, msg_type=link_protocol.TYPE_RESPONSE, trace_id=None):
+        """Returns False if the message was too long to send"""
+        with self.lock:
+            if self.encoder is None:
+                self.ser.write(f"{link_protocol.one_line(text)}\n".encode())
+                return True
+            try:
+                frames = self.encoder.encode(text, msg_type, trace_id=trace_id)
+            except link_protocol.MessageTooLong as e:
+                print(f"  [link] not sent, {e}: {text[:40]}")
+                return False
+            self.ser.write(b"".join(frame + b"\n" for frame in frames))
+            return True
+
+
+class Job:
+    """Handle passed to a running job; output is dropped once it's stale"""
+
+    def __init__(self, name, writer, generation, current):
+        self.name = name
+        self.writer = writer
+        self.generation = generation
+        self._current = current
+        self.cancelled = threading.Event()
+        self.received = time.time()   # wall clock, for tracing
+        self.trace_id = None          # sent with every line when set
+
+    @property
+    def stale(self):
+        return self.cancelled.is_set() or self._current() != self.generation
+
+    def emit(self, text):
+        """Write a line if this job is still current; returns False if dropped"""
+        # Hold the writer lock across the check so a cancel can't slip in
+        # between deciding to write and writing
+        with self.writer.lock:
+            if self.stale:
+                print(f"  [stale {self.name} #{self.generation}] dropped: {text[:40]}")
+                return False
+            return self.writer.write_line(text, trace_id=self.trace_id)
+
+
+class CommandEngine:
+    """Event-loop command dispatcher for the Pi"""
+
+    def __init__(self, ser, policy=POLICY_JOIN, encoder=None):
+        self.ser = ser
+        self.reader = LineReader(ser)
+        self.writer = SerialWriter(ser, encoder)
+        self.policy = policy
+
+        self._instant = {}
+        self._jobs = {}
+        self._generation = {}
+        self._running = {}  # name -> (asyncio.Task, Job)
+        self._stopped = None
+
+    def register_instant(self, name, handler, cancels=(), msg_type=link_protocol.TYPE_STATUS):
+        """handler() runs on the loop and returns a line to send (or None)"""
+        self._instant[name] = (handler, tuple(cancels), msg_type)
+
+    def register_job(self, name, handler):
+        """handler(job) runs in a worker thread and writes via job.emit()"""
+        self._jobs[name] = handler
+        self._generation[name] = 0
+
+    # ---------- dispatch ----------
+
+    def dispatch(self, cmd):
+        cmd = cmd.strip().upper()
+        if not cmd:
+            return
+        print(f"\n>>> Command received: {cmd}")
+
+        if cmd in self._instant:
+            handler, cancels, msg_type = self._instant[cmd]
+            for name in cancels:
+                self.cancel(name)
+            line = handler()
+            if line:
+                self.writer.write_line(line, msg_type)
+        elif cmd in self._jobs:
+            self._start_job(cmd)
+        else:
+            print(f"Unknown command: {cmd}")
+
+    def cancel(self, name):
+        """Cancel a running job and invalidate anything it still writes"""
+        running = self._running.pop(name, None)
+        if running:
+            self._generation[name] += 1
+            task, job = running
+            job.cancelled.set()
+            task.cancel()
+            print(f"  Cancelled {name} #{job.generation}")
+
+    def _start_job(self, name):
+        running = self._running.get(name)
+        if running and not running[0].done():
+            if self.policy == POLICY_JOIN:
+                print(f"  {name} already in flight, joining #{running[1].generation}")
+                return
+            self.cancel(name)
+
+        self._generation[name] += 1
+        generation = self._generation[name]
+        job = Job(name, self.writer, generation, lambda: self._generation[name])
+        task = asyncio.get_running_loop().create_task(self._run_job(name, job))
+        self._running[name] = (task, job)
+
+    async def _run_job(self, name, job):
+        try:
+            await asyncio.to_thread(self._jobs[name], job)
+        except asyncio.CancelledError:
+            # The worker thread can't be killed; it notices job.cancelled
+            # and its output is already suppressed
+            pass
+        except Exception as e:
+            print(f"{name} failed: {e}")
+        finally:
+            running = self._running.get(name)
+            if running and running[1] is job:
+                del self._running[name]
+
+    # ---------- serial input ----------
+
+    def _on_readable(self):
+        try:
+            lines = self.reader.read_available()
+        except Exception as e:
+            print(f"Serial read error: {e}")
+            self._stopped.set()
+            return
+
+        for line in lines:
+            self.dispatch(line)
+
+    async def run(self):
+        """Run until the serial port fails or the task is cancelled"""
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        loop.add_reader(self.reader.fileno(), self._on_readable)
+        try:
+            await self._stopped.wait()
+        finally:
+            loop.remove_reader(self.reader.fileno())
+            for name in list(self._running):
+                self.cancel(name)
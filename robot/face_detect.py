@@ -0,0 +1,104 @@
+"""
+Therapy Robot - Face detection and cropping
+
+CPU-friendly OpenCV Haar cascades run on the low-res luma stream. Used by
+the prefetcher to notice people, and by the capture path to crop uploads
+down to the person instead of the whole scene.
+
+OpenCV is optional: load_detector() returns None without it and callers
+fall back to the full frame.
+"""
+
+import io
+import threading
+
+
+class FaceDetector:
+    """Haar cascade face (and upper-body fallback) detector on uint8 luma"""
+
+    def __init__(self, min_size=40, scale_factor=1.2, min_neighbors=5):
+        import cv2
+
+        self.face = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        if self.face.empty():
+            raise RuntimeError("Could not load face cascade")
+        self.body = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_upperbody.xml"
+        )
+        self.min_size = (min_size, min_size)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        # Prefetch thread and ROAST both use the detector
+        self._lock = threading.Lock()
+
+    def _run(self, cascade, luma, min_neighbors):
+        with self._lock:
+            boxes = cascade.detectMultiScale(
+                luma,
+                scaleFactor=self.scale_factor,
+                minNeighbors=min_neighbors,
+                minSize=self.min_size,
+            )
+        return [tuple(int(v) for v in b) for b in boxes]
+
+    def detect(self, luma):
+        """Return a list of (x, y, w, h) face boxes in luma coordinates"""
+        return self._run(self.face, luma, self.min_neighbors)
+
+    def detect_person(self, luma):
+        """Largest face box, else largest upper-body box, else None"""
+        boxes = self.detect(luma)
+        if not boxes and not self.body.empty():
+            boxes = self._run(self.body, luma, max(2, self.min_neighbors - 2))
+        if not boxes:
+            return None
+        return max(boxes, key=lambda b: b[2] * b[3])
+
+
+def load_detector():
+    """Return a FaceDetector, or None if OpenCV isn't available"""
+    try:
+        return FaceDetector()
+    except Exception as e:
+        print(f"Face detection disabled: {e}")
+        return None
+
+
+def crop_box(box, luma_size, frame_size, padding=0.6, below=1.5):
+    """
+    Scale a luma-space (x, y, w, h) box to frame coordinates and pad it.
+
+    `padding` is the fraction of the box added left, right and above;
+    `below` is the fraction added underneath so the outfit stays in shot.
+    Returns (left, top, right, bottom) clamped to the frame.
+    """
+    x, y, w, h = box
+    sx = frame_size[0] / luma_size[0]
+    sy = frame_size[1] / luma_size[1]
+
+    left = (x - w * padding) * sx
+    right = (x + w * (1 + padding)) * sx
+    top = (y - h * padding) * sy
+    bottom = (y + h * (1 + below)) * sy
+
+    return (
+        max(0, int(left)),
+        max(0, int(top)),
+        min(frame_size[0], int(right)),
+        min(frame_size[1], int(bottom)),
+    )
+
+
+def crop_jpeg(jpeg, box, max_size, quality):
+    """Crop a JPEG to `box`, shrink to fit `max_size` and re-encode"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(jpeg))
+    image = image.crop(box)
+    image.thumbnail(max_size)
+
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue(), image.size
@@ -0,0 +1,189 @@
+"""
+Therapy Robot - Face-triggered speculative prefetch
+
+A background thread runs a cheap face detector on the low-res stream.
+When a new face has been in view for a moment, the AI response for the
+current mode is requested before anyone presses ROAST. If the press
+comes while that response is still fresh (and the same scene is still
+in front of the camera), it is used straight away.
+"""
+
+import collections
+import threading
+import time
+
+import frame_quality
+from response_cache import dhash, hamming
+
+
+class Prefetch:
+    """One speculative AI request"""
+
+    def __init__(self, mode, phash):
+        self.mode = mode
+        self.phash = phash
+        self.started = time.monotonic()
+        self.finished = None
+        self.response = None
+        self.done = threading.Event()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.started
+
+
+class FacePrefetcher:
+    """
+    Watches the frame buffer for a stable new face and prefetches a response.
+
+    fetch(frame, mode) is the blocking AI call; it should return the
+    response text or None on failure.
+    """
+
+    def __init__(self, frame_buffer, detector, fetch, get_mode,
+                 interval=0.3, stable_seconds=0.8, max_age=20.0, max_wait=1.5,
+                 max_per_hour=60, new_face_distance=12, match_distance=10):
+        self.frame_buffer = frame_buffer
+        self.detector = detector
+        self.fetch = fetch
+        self.get_mode = get_mode
+
+        self.interval = interval
+        self.stable_seconds = stable_seconds
+        self.max_age = max_age                      # freshness limit (s)
+        self.max_wait = max_wait                    # ROAST waits this long for one in flight (s)
+        self.max_per_hour = max_per_hour            # spend limit
+        self.new_face_distance = new_face_distance  # scene change that counts as a new face
+        self.match_distance = match_distance        # ROAST frame must be this close to use it
+
+        self._lock = threading.Lock()
+        self._current = None          # latest Prefetch
+        self._face_since = None       # when the current face first appeared
+        self._recent = collections.deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.started = 0
+        self.used = 0
+        self.late = 0
+        self.wasted = 0
+        self.skipped_budget = 0
+
+    # ---------- background detection ----------
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._check()
+            except Exception as e:
+                print(f"Prefetch error: {e}")
+
+    def _check(self):
+        frame = self.frame_buffer.latest()
+        if frame is None or frame.luma is None:
+            return
+
+        if not self.detector.detect(frame.luma):
+            self._face_since = None
+            return
+
+        now = time.monotonic()
+        if self._face_since is None:
+            self._face_since = now
+        if now - self._face_since < self.stable_seconds:
+            return
+
+        mode = self.get_mode()
+        phash = dhash(frame.luma)
+        with self._lock:
+            current = self._current
+            if (current is not None and current.mode == mode
+                    and current.age < self.max_age
+                    and hamming(current.phash, phash) <= self.new_face_distance):
+                return  # already have one for this scene
+
+        if not frame_quality.score_frame(frame.luma).ok:
+            return
+        if not self._within_budget(now):
+            self.skipped_budget += 1
+            return
+
+        self._launch(frame, mode, phash)
+
+    def _within_budget(self, now):
+        while self._recent and now - self._recent[0] > 3600:
+            self._recent.popleft()
+        return len(self._recent) < self.max_per_hour
+
+    def _launch(self, frame, mode, phash):
+        prefetch = Prefetch(mode, phash)
+        with self._lock:
+            if self._current is not None and self._current.response is not None:
+                self.wasted += 1
+            self._current = prefetch
+        self._recent.append(prefetch.started)
+        self.started += 1
+        print(f"Face in view - prefetching {mode} response")
+
+        def run():
+            try:
+                prefetch.response = self.fetch(frame, mode)
+            finally:
+                prefetch.finished = time.monotonic()
+                prefetch.done.set()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # ---------- ROAST side ----------
+
+    def take(self, mode, phash, wait=True):
+        """
+        Return a prefetched response for this press, or None.
+
+        The prefetch must match the mode, be fresh, and have been made
+        from a frame close to the one the press selected. An in-flight
+        prefetch is waited for up to max_wait, since it is already ahead
+        of a new request; if it hung or is slower than that, the caller
+        makes a live request and the prefetch stays for a later press.
+        """
+        with self._lock:
+            prefetch = self._current
+            if prefetch is None:
+                return None
+            if (prefetch.mode != mode or prefetch.age > self.max_age
+                    or hamming(prefetch.phash, phash) > self.match_distance):
+                return None
+
+        if wait and not prefetch.done.wait(self.max_wait):
+            self.late += 1
+            print(f"Prefetch not ready after {self.max_wait:.1f}s, asking live")
+            return None
+        with self._lock:
+            if self._current is not prefetch:
+                return None   # another press took it, or a new face replaced it
+            self._current = None
+        if prefetch.response is None:
+            return None
+
+        self.used += 1
+        print(f"Using prefetched response ({prefetch.age:.1f}s old)")
+        return prefetch.response
+
+    def stats(self):
+        return {
+            "started": self.started,
+            "used": self.used,
+            "late": self.late,
+            "wasted": self.wasted,
+            "skipped_budget": self.skipped_budget,
+        }
@@ -0,0 +1,80 @@
+"""
+Therapy Robot - In-memory frame ring buffer
+
+The camera streams continuously in the background and every frame is
+JPEG-encoded straight into memory. The buffer keeps the last few frames
+keyed by capture time so a ROAST can take the one closest to the button
+press without touching the SD card.
+"""
+
+import collections
+import threading
+import time
+
+
+class Frame:
+    """A single captured frame"""
+
+    __slots__ = ("timestamp", "jpeg", "luma", "score")
+
+    def __init__(self, timestamp, jpeg, luma=None):
+        self.timestamp = timestamp  # time.monotonic() at capture
+        self.jpeg = jpeg            # encoded JPEG bytes
+        self.luma = luma            # low-res Y plane (numpy uint8) for scoring
+        self.score = None           # filled in lazily by frame_quality
+
+    @property
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+
+class FrameBuffer:
+    """Fixed-size ring buffer of the most recent frames"""
+
+    def __init__(self, size=8):
+        self._frames = collections.deque(maxlen=size)
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._frames)
+
+    def add(self, frame):
+        """Store a new frame, dropping the oldest if full"""
+        with self._cond:
+            self._frames.append(frame)
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def frames(self):
+        """Snapshot of buffered frames, oldest first"""
+        with self._cond:
+            return list(self._frames)
+
+    def closest(self, timestamp):
+        """Return the frame captured closest to `timestamp`"""
+        with self._cond:
+            if not self._frames:
+                return None
+            return min(self._frames, key=lambda f: abs(f.timestamp - timestamp))
+
+    def recent(self, count, before=None):
+        """Last `count` frames captured at or before `before`, oldest first"""
+        with self._cond:
+            frames = list(self._frames)
+        if before is not None:
+            frames = [f for f in frames if f.timestamp <= before]
+        return frames[-count:]
+
+    def wait_for_frame(self, timeout=1.0):
+        """Block until at least one frame is buffered"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._frames) > 0, timeout)
+            return self._frames[-1] if self._frames else None
+
+    def clear(self):
+        with self._cond:
+            self._frames.clear()
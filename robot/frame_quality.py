@@ -0,0 +1,112 @@
+"""
+Therapy Robot - Frame quality scoring
+
+Scores buffered frames on the low-res luma stream so ROAST can upload the
+sharpest, best-exposed one, or bail out before paying for an AI call
+when every frame is blurry, too dark or empty.
+"""
+
+import numpy as np
+
+# Rejection thresholds (tuned on 320x240 luma)
+MIN_SHARPNESS = 40.0     # Laplacian variance below this = motion blur / out of focus
+MIN_BRIGHTNESS = 35      # mean luma below this = too dark
+MAX_BRIGHTNESS = 225     # mean luma above this = blown out
+MIN_CONTRAST = 12.0      # luma std dev below this = empty / covered lens
+MAX_CLIPPED = 0.5        # fraction of pixels crushed or blown
+
+
+class FrameScore:
+    """Quality metrics for one frame"""
+
+    __slots__ = ("sharpness", "brightness", "contrast", "clipped", "exposure", "reason")
+
+    def __init__(self, sharpness, brightness, contrast, clipped, exposure, reason=None):
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.contrast = contrast
+        self.clipped = clipped
+        self.exposure = exposure
+        self.reason = reason  # None if the frame passes the gate
+
+    @property
+    def ok(self):
+        return self.reason is None
+
+    @property
+    def value(self):
+        """Single number used to rank frames (higher is better)"""
+        return np.log1p(self.sharpness) * self.exposure
+
+    def __repr__(self):
+        return (f"FrameScore(sharp={self.sharpness:.0f}, bright={self.brightness:.0f}, "
+                f"contrast={self.contrast:.1f}, clipped={self.clipped:.2f}, reason={self.reason})")
+
+
+def laplacian_variance(luma):
+    """Variance of the 4-neighbour Laplacian - a cheap focus measure"""
+    y = luma.astype(np.float32)
+    lap = (y[:-2, 1:-1] + y[2:, 1:-1] + y[1:-1, :-2] + y[1:-1, 2:]
+           - 4.0 * y[1:-1, 1:-1])
+    return float(lap.var())
+
+
+def exposure_stats(luma):
+    """Return (mean, std, clipped fraction, exposure score 0-1) from the histogram"""
+    hist = np.bincount(luma.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    levels = np.arange(256)
+
+    mean = float((hist * levels).sum() / total)
+    std = float(np.sqrt((hist * (levels - mean) ** 2).sum() / total))
+    clipped = float((hist[:8].sum() + hist[248:].sum()) / total)
+
+    # 1.0 at mid-grey, falling off towards black/white and with clipping
+    exposure = max(0.0, 1.0 - abs(mean - 128.0) / 128.0) * (1.0 - clipped)
+    return mean, std, clipped, exposure
+
+
+def score_frame(luma):
+    """Score a single 2-D uint8 luma array"""
+    sharpness = laplacian_variance(luma)
+    mean, std, clipped, exposure = exposure_stats(luma)
+
+    reason = None
+    if std < MIN_CONTRAST:
+        reason = "empty"
+    elif mean < MIN_BRIGHTNESS:
+        reason = "dark"
+    elif mean > MAX_BRIGHTNESS or clipped > MAX_CLIPPED:
+        reason = "bright"
+    elif sharpness < MIN_SHARPNESS:
+        reason = "blurry"
+
+    return FrameScore(sharpness, mean, std, clipped, exposure, reason)
+
+
+def select_best(frames):
+    """
+    Pick the best frame from a list of Frame objects with a `luma` array.
+
+    Returns (frame, score). If no frame passes the gate, frame is None and
+    score is the best rejected score (its `reason` says why).
+    """
+    best = None
+    best_rejected = None
+
+    for frame in frames:
+        if frame.luma is None:
+            continue
+        if frame.score is None:
+            frame.score = score_frame(frame.luma)
+        score = frame.score
+
+        if score.ok:
+            if best is None or score.value > best[1].value:
+                best = (frame, score)
+        elif best_rejected is None or score.value > best_rejected.value:
+            best_rejected = score
+
+    if best:
+        return best
+    return None, best_rejected
@@ -0,0 +1,247 @@
+"""
+Therapy Robot - Hedged AI requests
+
+Sends the request to the primary model, and if it hasn't produced an
+answer by a deadline (a percentile of its recent latencies), sends the
+same prompt to a faster fallback model. Whichever answers first wins and
+the other is cancelled.
+
+An attempt "answers" when it calls attempt.claim(): non-streaming calls
+claim when the completion arrives, streaming calls claim on the first
+token so only one model ever writes to the serial link.
+
+Given a `cancelled` event (the ROAST was cancelled), run() stops waiting
+as soon as it is set, cancels every attempt and raises Cancelled.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+CANCEL_CHECK = 0.05   # seconds between checks of the `cancelled` event
+
+
+class Cancelled(Exception):
+    """The request was cancelled before a model answered"""
+
+
+class LatencyTracker:
+    """Rolling window of latencies (seconds) for one model"""
+
+    def __init__(self, window=50):
+        self.samples = collections.deque(maxlen=window)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def expected_beyond(self, t):
+        """Mean of past latencies longer than t (what we'd likely have waited)"""
+        longer = [s for s in self.samples if s > t]
+        return sum(longer) / len(longer) if longer else t
+
+
+class Attempt:
+    """One model's try at the request"""
+
+    def __init__(self, model, race):
+        self.model = model
+        self.race = race
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self.response = None   # in-flight HTTP response, closed on cancel
+
+    def claim(self):
+        """Try to become the winner; False means another model already won"""
+        return self.race.claim(self)
+
+    def cancel(self):
+        self.cancelled.set()
+        response = self.response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+
+class Race:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.winner = None
+        self.won_at = None
+
+    def claim(self, attempt):
+        with self._lock:
+            if self.winner is None and not attempt.cancelled.is_set():
+                self.winner = attempt
+                self.won_at = time.monotonic()
+            return self.winner is attempt
+
+
+class HedgeResult:
+    __slots__ = ("value", "model", "hedged", "latency", "saved", "outcomes")
+
+    def __init__(self, value, model, hedged, latency, saved, outcomes=()):
+        self.value = value
+        self.model = model        # winning model
+        self.hedged = hedged      # True if the fallback was launched
+        self.latency = latency    # primary start to winning claim (s)
+        self.saved = saved        # estimated seconds saved by hedging
+        # (model, seconds, status) per attempt; status is "won", "lost"
+        # (cancelled after at least that long), "failed" or "cancelled"
+        # (abandoned with the request)
+        self.outcomes = list(outcomes)
+
+    def __str__(self):
+        text = f"winner {self.model} in {self.latency * 1000:.0f} ms"
+        if self.hedged:
+            text += f" (hedged, ~{self.saved * 1000:.0f} ms saved)"
+        return text
+
+
+class Hedger:
+    """
+    Runs call(model, attempt) against a primary and a fallback model.
+
+    call() must return the result, raise on failure, and call
+    attempt.claim() when it has an answer (aborting if claim() is False).
+    """
+
+    def __init__(self, primary, fallback, percentile=90, default_deadline=4.0,
+                 min_deadline=1.5, max_deadline=10.0, min_samples=5, hedge=True):
+        self.primary = primary
+        self.fallback = fallback
+        self.hedge = hedge  # False: only ever run the primary
+        self.percentile = percentile
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.min_samples = min_samples
+
+        self.latency = collections.defaultdict(LatencyTracker)
+        self.stats = {"requests": 0, "hedged": 0, "fallback_wins": 0, "saved": 0.0}
+
+    def deadline(self, primary=None):
+        tracker = self.latency[primary or self.primary]
+        if len(tracker.samples) < self.min_samples:
+            return self.default_deadline
+        value = tracker.percentile(self.percentile)
+        return max(self.min_deadline, min(self.max_deadline, value))
+
+    def run(self, call, primary=None, fallback=None, cancelled=None):
+        """
+        Race `primary` (default self.primary) against `fallback` if it's
+        slow. Raises Cancelled if `cancelled` is set before an answer.
+        """
+        primary_model = primary or self.primary
+        fallback_model = fallback or self.fallback
+        if cancelled is not None and cancelled.is_set():
+            raise Cancelled("cancelled before the request")
+        race = Race()
+        done = queue.Queue()
+        attempts = []
+
+        def launch(model):
+            attempt = Attempt(model, race)
+            attempts.append(attempt)
+
+            def worker():
+                try:
+                    done.put((attempt, call(model, attempt), None))
+                except Exception as e:
+                    done.put((attempt, None, e))
+
+            threading.Thread(target=worker, daemon=True).start()
+            return attempt
+
+        self.stats["requests"] += 1
+        primary = launch(primary_model)
+        deadline = self.deadline(primary_model)
+        hedged = False
+        finished = {}
+        last_error = None
+        abandoned = False
+
+        while True:
+            if cancelled is not None and cancelled.is_set() and race.winner is None:
+                abandoned = True
+                break
+            timeout = None
+            if self.hedge and not hedged and race.winner is None:
+                timeout = max(0.0, primary.started + deadline - time.monotonic())
+            if cancelled is not None and race.winner is None:
+                timeout = CANCEL_CHECK if timeout is None else min(timeout, CANCEL_CHECK)
+            try:
+                attempt, value, error = done.get(timeout=timeout)
+            except queue.Empty:
+                # Woken only to check `cancelled`, or the deadline has passed
+                if (self.hedge and not hedged and race.winner is None
+                        and time.monotonic() >= primary.started + deadline
+                        and not (cancelled is not None and cancelled.is_set())):
+                    print(f"{primary_model} slow (> {deadline:.1f}s), hedging with {fallback_model}")
+                    hedged = True
+                    self.stats["hedged"] += 1
+                    launch(fallback_model)
+                continue
+
+            finished[attempt] = (value, error)
+            if error is not None:
+                last_error = error
+                print(f"{attempt.model} failed: {error}")
+                # Primary failed before the deadline: try the fallback now
+                if self.hedge and not hedged and race.winner is None:
+                    hedged = True
+                    launch(fallback_model)
+                    continue
+
+            if race.winner is not None and race.winner in finished:
+                break
+            if len(finished) == len(attempts) and (hedged or error is None or not self.hedge):
+                # Everyone is done (or the only attempt gave up unclaimed)
+                break
+
+        winner = race.winner
+        now = time.monotonic()
+        outcomes = []
+        for attempt in attempts:
+            error = finished.get(attempt, (None, None))[1]
+            if attempt is winner:
+                outcomes.append((attempt.model, race.won_at - attempt.started, "won"))
+                continue
+            attempt.cancel()
+            if error is not None:
+                outcomes.append((attempt.model, now - attempt.started, "failed"))
+            elif abandoned:
+                outcomes.append((attempt.model, now - attempt.started, "cancelled"))
+            elif winner is not None:
+                outcomes.append((attempt.model, race.won_at - attempt.started, "lost"))
+                if attempt is primary:
+                    # Censored sample: the primary took at least this long
+                    self.latency[primary_model].add(race.won_at - primary.started)
+
+        if abandoned or (winner is None and cancelled is not None and cancelled.is_set()):
+            error = Cancelled("cancelled before any model answered")
+            error.outcomes = outcomes
+            raise error
+        if winner is None or finished[winner][1] is not None:
+            error = last_error or RuntimeError("No model answered")
+            error.outcomes = outcomes
+            raise error
+
+        latency = race.won_at - primary.started
+        saved = 0.0
+        if winner is not primary:
+            self.stats["fallback_wins"] += 1
+            saved = max(0.0, self.latency[primary_model].expected_beyond(latency) - latency)
+            self.stats["saved"] += saved
+        self.latency[winner.model].add(race.won_at - winner.started)
+
+        return HedgeResult(finished[winner][0], winner.model, hedged, latency, saved, outcomes)
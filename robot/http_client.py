@@ -0,0 +1,140 @@
+"""
+Therapy Robot - Persistent HTTPS client
+
+One long-lived requests.Session with keep-alive connection pooling, so a
+ROAST doesn't pay for DNS + TCP + TLS every time. The connection is
+opened at startup and kept hot with periodic pings. Every request records
+how long connect, TLS and time-to-first-byte took.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Per-thread timing of the request currently being sent
+_local = threading.local()
+
+
+class RequestTiming:
+    """Where the time went for one request (seconds)"""
+
+    __slots__ = ("connect", "tls", "ttfb", "reused")
+
+    def __init__(self):
+        self.connect = 0.0   # DNS + TCP
+        self.tls = 0.0       # TLS handshake
+        self.ttfb = 0.0      # request start to response headers
+        self.reused = True   # False if a new connection was opened
+
+    def __str__(self):
+        conn = "reused" if self.reused else f"connect {self.connect * 1000:.0f} ms, tls {self.tls * 1000:.0f} ms"
+        return f"{conn}, ttfb {self.ttfb * 1000:.0f} ms"
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """HTTPSConnection that reports connect / TLS time to the current request"""
+
+    def _new_conn(self):
+        start = time.monotonic()
+        sock = super()._new_conn()
+        self._tcp_time = time.monotonic() - start
+        return sock
+
+    def connect(self):
+        self._tcp_time = 0.0
+        start = time.monotonic()
+        super().connect()
+        total = time.monotonic() - start
+
+        timing = getattr(_local, "timing", None)
+        if timing is not None:
+            timing.reused = False
+            timing.connect = self._tcp_time
+            timing.tls = max(0.0, total - self._tcp_time)
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose HTTPS pools use TimedHTTPSConnection"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": HTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class PooledClient:
+    """Long-lived session with warm-up and keep-alive pings"""
+
+    def __init__(self, pool_size=2, keepalive_interval=25.0):
+        self.session = requests.Session()
+        adapter = TimedAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+        self.keepalive_interval = keepalive_interval
+        self._last_used = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def last_timing(self):
+        """Timing of the last request made from this thread"""
+        return getattr(_local, "timing", None)
+
+    def request(self, method, url, **kwargs):
+        timing = RequestTiming()
+        _local.timing = timing
+        start = time.monotonic()
+        try:
+            # With stream=True this returns once headers arrive, so it is TTFB
+            response = self.session.request(method, url, **kwargs)
+        finally:
+            timing.ttfb = time.monotonic() - start
+            self._last_used = time.monotonic()
+        return response
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def warm_up(self, url, headers=None):
+        """Open (or refresh) a pooled connection to the API host"""
+        try:
+            response = self.get(url, headers=headers, timeout=10)
+            response.close()
+            print(f"Connection warm ({self.last_timing})")
+            return True
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            return False
+
+    def start_keepalive(self, url, headers=None):
+        """Ping `url` whenever the connection has been idle for a while"""
+        def worker():
+            while not self._stop.wait(self.keepalive_interval / 2):
+                if time.monotonic() - self._last_used < self.keepalive_interval:
+                    continue
+                try:
+                    self.get(url, headers=headers, timeout=10).close()
+                except Exception as e:
+                    print(f"Keep-alive ping failed: {e}")
+
+        self._thread = threading.Thread(target=worker, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.session.close()
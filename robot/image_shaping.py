@@ -0,0 +1,78 @@
+"""
+Therapy Robot - Upload image shaping
+
+Controls what actually gets uploaded to the vision model: resolution,
+JPEG quality and colour. Resolution is applied by the camera ISP (the
+capture stream is configured at the upload size) so nothing is resized
+in software. Quality can be steered towards a target byte size, and the
+resolution can be derived from a vision-token budget.
+"""
+
+import io
+import math
+
+# Anthropic-style estimate: tokens ~= width * height / 750
+PIXELS_PER_TOKEN = 750
+
+
+def estimate_vision_tokens(width, height):
+    """Rough input-token cost of an image of the given size"""
+    return math.ceil(width * height / PIXELS_PER_TOKEN)
+
+
+def size_for_token_budget(budget, aspect=4 / 3, align=32):
+    """Largest (width, height) with the given aspect that fits the budget"""
+    pixels = budget * PIXELS_PER_TOKEN
+    height = math.sqrt(pixels / aspect)
+    width = height * aspect
+    width = max(align, int(width) // align * align)
+    height = max(align // 2, int(width / aspect) // 2 * 2)
+    return width, height
+
+
+def resolve_upload_size(size, token_budget=None):
+    """Apply an optional token budget on top of the configured size"""
+    if not token_budget:
+        return size
+    width, height = size
+    budget_size = size_for_token_budget(token_budget, aspect=width / height)
+    if budget_size[0] * budget_size[1] < width * height:
+        return budget_size
+    return size
+
+
+def encode_gray_jpeg(luma, quality):
+    """Encode a 2-D uint8 luma plane as a greyscale JPEG"""
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.fromarray(luma, mode="L").save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+class JpegRateControl:
+    """
+    Nudges JPEG quality frame by frame so encoded size tracks a target.
+
+    The camera encodes every frame anyway, so instead of re-encoding the
+    chosen frame several times we adjust the quality used for the next one.
+    """
+
+    def __init__(self, quality, target_bytes=None, min_quality=30, max_quality=95):
+        self.quality = quality
+        self.target_bytes = target_bytes
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+
+    def update(self, nbytes):
+        """Feed the size of the last encoded frame; returns the next quality"""
+        if not self.target_bytes or nbytes <= 0:
+            return self.quality
+
+        ratio = self.target_bytes / nbytes
+        if ratio < 0.9:
+            step = max(1, round((1 - ratio) * 20))
+            self.quality = max(self.min_quality, self.quality - step)
+        elif ratio > 1.1:
+            self.quality = min(self.max_quality, self.quality + 1)
+        return self.quality
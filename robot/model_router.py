@@ -0,0 +1,221 @@
+"""
+Therapy Robot - Latency-aware model router
+
+Keeps a rolling latency record (EWMA plus p50/p95) and an error rate for
+every model in the pool, per mode. Each ROAST goes to the first model (in
+preference order) that is likely enough to answer within the target
+latency, with occasional exploration so the numbers stay current. Stats
+are saved to a small JSON file so they survive a restart.
+
+A failed call is recorded at `failure_penalty` seconds (the request
+timeout), so it counts toward warm-up and drags down the model's chance
+of meeting the target; models failing more than `max_error_rate` of
+recent calls are skipped unless every model is.
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+WINDOW = 50          # latency samples kept per model/mode
+EWMA_ALPHA = 0.2
+ERROR_WINDOW = 20    # recent outcomes used for the error rate
+
+
+class ModelStats:
+    """Rolling latency/error record for one (mode, model)"""
+
+    def __init__(self, samples=None, outcomes=None, ewma=None, last_used=0.0):
+        self.samples = list(samples or [])[-WINDOW:]    # seconds
+        self.outcomes = list(outcomes or [])[-ERROR_WINDOW:]  # 1 = ok, 0 = error
+        self.ewma = ewma
+        self.last_used = last_used  # wall clock, survives restarts
+
+    def add(self, latency, ok=True):
+        self.last_used = time.time()
+        self.outcomes = (self.outcomes + [1 if ok else 0])[-ERROR_WINDOW:]
+        if latency is None:
+            return
+        self.samples = (self.samples + [latency])[-WINDOW:]
+        if self.ewma is None:
+            self.ewma = latency
+        else:
+            self.ewma = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def p_meet(self, target):
+        """Chance of a successful answer within `target` seconds"""
+        if not self.samples:
+            return None
+        within = sum(1 for s in self.samples if s <= target) / len(self.samples)
+        return within * (1.0 - self.error_rate)
+
+    def to_dict(self):
+        return {
+            "samples": [round(s, 3) for s in self.samples],
+            "outcomes": self.outcomes,
+            "ewma": self.ewma,
+            "last_used": self.last_used,
+        }
+
+    def summary(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        if p50 is None:
+            return "no data"
+        return (f"ewma {self.ewma:.2f}s p50 {p50:.2f}s p95 {p95:.2f}s "
+                f"err {self.error_rate:.0%} n={len(self.samples)}")
+
+
+class ModelRouter:
+    """
+    Picks a model per request.
+
+    `models` is in preference order (best answers first). A model is
+    chosen if its chance of meeting `target` is at least `confidence`;
+    otherwise the model with the best chance wins. Models with fewer than
+    `min_samples` samples, or with stats older than `stale_after`, get
+    explored; `explore` is the chance of a random pick regardless.
+
+    State is written at most every `save_interval` seconds; call save()
+    on shutdown to write the rest.
+    """
+
+    def __init__(self, models, target=3.0, confidence=0.8, explore=0.05,
+                 min_samples=3, stale_after=3600, failure_penalty=30.0,
+                 max_error_rate=0.5, state_file=None, save_interval=60.0):
+        self.models = list(models)
+        self.target = target
+        self.confidence = confidence
+        self.explore = explore
+        self.min_samples = min_samples
+        self.stale_after = stale_after
+        self.failure_penalty = failure_penalty
+        self.max_error_rate = max_error_rate
+        self.state_file = state_file
+        self.save_interval = save_interval
+
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # one writer of state_file at a time
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.load()
+
+    def stats(self, mode, model):
+        key = f"{mode}|{model}"
+        if key not in self._stats:
+            self._stats[key] = ModelStats()
+        return self._stats[key]
+
+    def healthy(self, mode):
+        """Models not failing too often (all of them if none qualify)"""
+        ok = [m for m in self.models
+              if len(self.stats(mode, m).outcomes) < self.min_samples
+              or self.stats(mode, m).error_rate <= self.max_error_rate]
+        return ok or list(self.models)
+
+    def choose(self, mode):
+        """Return (model, reason)"""
+        with self._lock:
+            now = time.time()
+            models = self.healthy(mode)
+            for model in models:
+                st = self.stats(mode, model)
+                if len(st.samples) < self.min_samples:
+                    return model, "warming up"
+            # Exploration and staleness include failing models, so one
+            # that recovers gets picked up again
+            if random.random() < self.explore:
+                return random.choice(self.models), "explore"
+
+            stale = [m for m in self.models
+                     if now - self.stats(mode, m).last_used > self.stale_after]
+            if stale:
+                return stale[0], "stale"
+
+            scores = {m: self.stats(mode, m).p_meet(self.target) for m in models}
+            for model in models:
+                if scores[model] >= self.confidence:
+                    return model, f"p(meet {self.target:.1f}s)={scores[model]:.2f}"
+            best = max(models, key=lambda m: scores[m])
+            return best, f"best p(meet)={scores[best]:.2f}"
+
+    def fallback_for(self, mode, primary):
+        """Fastest other model (lowest p50), for hedging"""
+        with self._lock:
+            others = [m for m in self.models if m != primary]
+            if not others:
+                return primary
+
+            def p50(model):
+                value = self.stats(mode, model).percentile(50)
+                return value if value is not None else float("inf")
+
+            return min(others, key=p50)
+
+    def record(self, mode, model, latency, ok=True):
+        if not ok:
+            latency = max(latency or 0.0, self.failure_penalty)
+        with self._lock:
+            self.stats(mode, model).add(latency, ok)
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def summary(self, mode):
+        with self._lock:
+            return {m: self.stats(mode, m).summary() for m in self.models}
+
+    # ---------- persistence ----------
+
+    def load(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file) as f:
+                data = json.load(f)
+            for key, value in data.get("stats", {}).items():
+                self._stats[key] = ModelStats(**value)
+            print(f"Router: loaded stats for {len(self._stats)} model/mode pairs")
+        except Exception as e:
+            print(f"Router: could not load {self.state_file}: {e}")
+
+    def save(self):
+        """Write the stats if anything changed since the last save"""
+        if not self.state_file:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {"stats": {k: v.to_dict() for k, v in self._stats.items()}}
+                self._dirty = False
+                self._last_save = time.monotonic()
+            tmp = None
+            try:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.state_file) or ".",
+                                           prefix=".router_state.", suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.state_file)
+            except Exception as e:
+                print(f"Router: could not save {self.state_file}: {e}")
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+                with self._lock:
+                    self._dirty = True
@@ -2,28 +2,165 @@
 Therapy Robot - Raspberry Pi Controller
 
 Listens for commands from ESP32 via UART:
-  - ROAST: Take photo, send to AI, return response
+  - ROAST: Grab latest buffered photo, send to AI, return response
   - TOGGLE: Switch between Evil and Therapy mode
 
 Sends responses back to ESP32 via UART
 """
 
+import asyncio
 import base64
-import requests
+import io
+import json
 import serial
+import sys
+import threading
 import time
 import os
 
+# Modules shared with the laptop scripts (serial_lines, ...) live in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_buffer import Frame, FrameBuffer
+import ai_stream
+import command_engine
+import face_detect
+import face_prefetch
+import frame_quality
+import hedging
+import http_client
+import image_shaping
+import link_protocol
+import model_router
+import response_cache
+import tracing
+
 # ==================== CONFIGURATION ====================
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "your-api-key-here")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+AI_TIMEOUT = 30  # seconds
 MODEL = "anthropic/claude-3.5-sonnet"
 
+# Model routing: each ROAST goes to the first model in MODEL_POOL (best
+# answers first) that usually answers within TARGET_LATENCY for the
+# current mode. Stats persist in ROUTER_STATE_FILE across restarts.
+ROUTING = True
+MODEL_POOL = [
+    MODEL,
+    "openai/gpt-4o-mini",
+    "google/gemini-2.0-flash-001",
+]
+TARGET_LATENCY = 3.0          # seconds to first token (streaming) or full reply
+ROUTER_CONFIDENCE = 0.8       # required chance of meeting the target
+ROUTER_EXPLORE = 0.05         # chance of trying a random model
+ROUTER_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_state.json")
+ROUTER_MAX_ERROR_RATE = 0.5   # skip models failing more often than this
+ROUTER_SAVE_INTERVAL = 60     # seconds between state file writes (SD card wear)
+
+# Hedging: if MODEL hasn't answered (first token when streaming) by the
+# HEDGE_PERCENTILE of its recent latencies, race FALLBACK_MODEL against it
+HEDGE = True
+FALLBACK_MODEL = "google/gemini-2.0-flash-001"
+HEDGE_PERCENTILE = 90
+HEDGE_DEFAULT_DEADLINE = 4.0   # seconds, until enough samples are collected
+HEDGE_MIN_DEADLINE = 1.5
+HEDGE_MAX_DEADLINE = 10.0
+
+# Stream the completion and send each sentence to the ESP32 as soon as it
+# is complete, so the laptop can start speaking before generation ends
+STREAM_RESPONSES = True
+
+# Persistent connection: warmed at startup and pinged when idle so the
+# TLS session to OpenRouter is always hot
+OPENROUTER_WARMUP_URL = "https://openrouter.ai/api/v1/auth/key"
+KEEPALIVE_INTERVAL = 25  # seconds
+
+api_client = http_client.PooledClient(keepalive_interval=KEEPALIVE_INTERVAL)
+
+hedger = hedging.Hedger(
+    MODEL, FALLBACK_MODEL,
+    percentile=HEDGE_PERCENTILE,
+    default_deadline=HEDGE_DEFAULT_DEADLINE,
+    min_deadline=HEDGE_MIN_DEADLINE,
+    max_deadline=HEDGE_MAX_DEADLINE,
+    hedge=HEDGE,
+)
+
+router = model_router.ModelRouter(
+    MODEL_POOL,
+    target=TARGET_LATENCY,
+    confidence=ROUTER_CONFIDENCE,
+    explore=ROUTER_EXPLORE,
+    failure_penalty=AI_TIMEOUT,
+    max_error_rate=ROUTER_MAX_ERROR_RATE,
+    state_file=ROUTER_STATE_FILE,
+    save_interval=ROUTER_SAVE_INTERVAL,
+) if ROUTING else None
+
+# Fallback lines when the AI call fails (never cached)
+API_ERROR_RESPONSE = "I'm having trouble thinking right now."
+BRAIN_ERROR_RESPONSE = "Something went wrong with my brain."
+
+# Response cache: near-identical frames (by perceptual hash) in the same
+# mode reuse a recent response instead of a new vision round trip.
+# CACHE_VARIANTS > 1 generates that many responses before reusing them.
+RESPONSE_CACHE = True
+CACHE_TTL = 120              # seconds
+CACHE_MAX_ENTRIES = 32
+CACHE_MAX_DISTANCE = 6       # Hamming distance out of 64 bits
+CACHE_VARIANTS = 3
+
+response_cache_store = response_cache.ResponseCache(
+    max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL,
+    max_distance=CACHE_MAX_DISTANCE, max_variants=CACHE_VARIANTS
+)
+
+# Speculative prefetch: when a new face has been in view for a moment,
+# request the response before the button is pressed. Needs OpenCV, and
+# every unused prefetch is a paid call, so it's capped per hour.
+PREFETCH = False
+PREFETCH_STABLE_SECONDS = 0.8   # face must be in view this long
+PREFETCH_MAX_AGE = 20           # seconds a prefetched response stays usable
+PREFETCH_MAX_WAIT = 1.5         # seconds a ROAST waits for one still in flight
+PREFETCH_MAX_PER_HOUR = 60
+
+prefetcher = None
+
 # UART config
 SERIAL_PORT = "/dev/serial0"  # Default Pi UART
 BAUD_RATE = 115200
 
+# Send everything as link_protocol frames so responses longer than one
+# ESP-NOW packet (244 bytes) are fragmented instead of truncated.
+# The laptop scripts understand both framed and plain lines.
+FRAMED_LINK = True
+# Deflate responses against the shared link dictionary (link_dict.bin,
+# or the built-in one) when that makes them shorter. Both ends must use
+# the same dictionary; rebuild it with tools/build_link_dict.py.
+COMPRESS_LINK = True
+link_encoder = link_protocol.Encoder(
+    compressor=link_protocol.load_compressor() if COMPRESS_LINK else None
+) if FRAMED_LINK else None
+
+# Every real AI response is appended here (one JSON object per line) as
+# material for tools/build_link_dict.py
+RESPONSE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "responses.jsonl")
+
+# ROAST tracing: the trace ID goes to the laptop with the response and
+# each side appends its stage timestamps to a JSONL file. Merge them
+# with tools/trace_report.py.
+TRACING = True
+TRACE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trace_pi.jsonl")
+
+trace_log = tracing.TraceLog(TRACE_LOG) if TRACING else None
+
+# A ROAST pressed while one is in flight: "join" lets the running one
+# answer it, "restart" cancels it and starts over with a fresh frame
+ROAST_POLICY = command_engine.POLICY_JOIN
+# Drop an in-flight ROAST when the mode is toggled (its answer is for the old mode)
+TOGGLE_CANCELS_ROAST = True
+
 # ==================== MODES ====================
 
 MODE_THERAPY = "therapy"
@@ -46,60 +183,206 @@ Think comedy roast, not actual cruelty."""
 
 # ==================== CAMERA ====================
 
+# Continuous capture: frames are JPEG-encoded in memory as they arrive
+# and kept in a small ring buffer keyed by capture time.
+LORES_SIZE = (320, 240)     # ISP-scaled stream used for quality scoring
+CAPTURE_FPS = 10
+FRAME_BUFFER_SIZE = 8
+
+# Upload shaping: the main stream is configured at the upload size so the
+# ISP does the resize. TARGET_JPEG_BYTES steers JPEG quality towards a
+# size, VISION_TOKEN_BUDGET shrinks the resolution to fit a token budget.
+UPLOAD_SIZE = (640, 480)
+UPLOAD_GRAYSCALE = False
+JPEG_QUALITY = 85
+TARGET_JPEG_BYTES = None    # e.g. 30_000
+VISION_TOKEN_BUDGET = None  # e.g. 250
+
+# Frame selection: score the last N frames before the press, upload the
+# best one, or answer immediately if none are usable
+SELECT_FRAMES = 5
+QUALITY_GATE = True
+REJECT_RESPONSES = {
+    "empty": "I can't see anyone. Step in front of my camera!",
+    "dark": "It's way too dark in here for me to see you. Find some light!",
+    "bright": "The light is blinding me. Try stepping out of the glare!",
+    "blurry": "You're all blurry. Hold still for a second and try again!",
+}
+
+# Face crop: upload only the padded region around the largest face (or
+# upper body) at no more than CROP_MAX_SIZE; full frame if nobody is found
+CROP_TO_FACE = True
+CROP_PADDING = 0.6          # fraction of the face box added on each side
+CROP_PADDING_BELOW = 1.5    # extra below the face to keep the outfit in shot
+CROP_MAX_SIZE = (384, 384)
+
 camera = None
+face_detector = None
+capture_size = UPLOAD_SIZE
+lores_size = LORES_SIZE
+rate_control = image_shaping.JpegRateControl(JPEG_QUALITY, TARGET_JPEG_BYTES)
+frame_buffer = FrameBuffer(FRAME_BUFFER_SIZE)
+capture_thread = None
+capture_stop = threading.Event()
 
 def init_camera():
-    global camera
+    global camera, capture_size, lores_size
     from picamera2 import Picamera2
     
     print("Initializing camera...")
     camera = Picamera2()
-    config = camera.create_still_configuration(
-        main={"size": (640, 480)}
+    capture_size = image_shaping.resolve_upload_size(UPLOAD_SIZE, VISION_TOKEN_BUDGET)
+    # lores can't be larger than main
+    lores_size = (min(LORES_SIZE[0], capture_size[0]), min(LORES_SIZE[1], capture_size[1]))
+    
+    frame_us = int(1_000_000 / CAPTURE_FPS)
+    config = camera.create_video_configuration(
+        main={"size": capture_size, "format": "YUV420" if UPLOAD_GRAYSCALE else "RGB888"},
+        lores={"size": lores_size, "format": "YUV420"},
+        controls={"FrameDurationLimits": (frame_us, frame_us)}
     )
+    camera.align_configuration(config)
     camera.configure(config)
+    capture_size = config["main"]["size"]
+    lores_size = config["lores"]["size"]
+    camera.options["quality"] = rate_control.quality
+    
+    tokens = image_shaping.estimate_vision_tokens(*capture_size)
+    print(f"Upload shape: {capture_size[0]}x{capture_size[1]} "
+          f"{'grey' if UPLOAD_GRAYSCALE else 'colour'}, q={rate_control.quality}, ~{tokens} tokens")
     camera.start()
-    time.sleep(1)
+    start_capture()
+    
+    if frame_buffer.wait_for_frame(timeout=3.0) is None:
+        print("WARNING: no frames from camera yet")
     print("Camera ready!")
 
 
-def capture_image():
-    """Capture image and return as base64"""
-    filename = "/tmp/capture.jpg"
-    camera.capture_file(filename)
+def capture_worker():
+    """Background thread that keeps the frame buffer full"""
+    while not capture_stop.is_set():
+        try:
+            request = camera.capture_request()
+            timestamp = time.monotonic()
+            try:
+                if UPLOAD_GRAYSCALE:
+                    # YUV420 main: encode the Y plane directly, no colour conversion
+                    y = request.make_array("main")[:capture_size[1], :capture_size[0]]
+                    jpeg = image_shaping.encode_gray_jpeg(y, rate_control.quality)
+                else:
+                    camera.options["quality"] = rate_control.quality
+                    buf = io.BytesIO()
+                    request.save("main", buf, format="jpeg")
+                    jpeg = buf.getvalue()
+                # YUV420 lores: the first `height` rows are the Y plane
+                luma = request.make_array("lores")[:lores_size[1], :lores_size[0]].copy()
+            finally:
+                request.release()
+            rate_control.update(len(jpeg))
+            frame_buffer.add(Frame(timestamp, jpeg, luma))
+        except Exception as e:
+            print(f"Capture error: {e}")
+            time.sleep(0.5)
+
+
+def start_capture():
+    global capture_thread
+    capture_stop.clear()
+    capture_thread = threading.Thread(target=capture_worker, daemon=True)
+    capture_thread.start()
+
+
+def stop_capture():
+    capture_stop.set()
+    if capture_thread:
+        capture_thread.join(timeout=2)
+
+
+def select_frame(press_time):
+    """
+    Pick the frame to upload for a press.
+
+    Returns (frame, reject_reason). With the quality gate on, the best of
+    the last SELECT_FRAMES frames is used; if none pass, frame is None.
+    """
+    if not QUALITY_GATE:
+        frame = frame_buffer.closest(press_time) or frame_buffer.wait_for_frame(timeout=1.0)
+        return frame, None
+    
+    candidates = frame_buffer.recent(SELECT_FRAMES, before=press_time)
+    if not candidates:
+        latest = frame_buffer.wait_for_frame(timeout=1.0)
+        candidates = [latest] if latest else []
+    
+    frame, score = frame_quality.select_best(candidates)
+    if frame is not None:
+        print(f"Best of {len(candidates)} frames: {score}")
+        return frame, None
+    if score is None:
+        # No luma available to score - fall back to the closest frame
+        return frame_buffer.closest(press_time), None
+    
+    print(f"All {len(candidates)} frames rejected: {score}")
+    return None, score.reason
+
+
+def crop_frame(frame):
+    """Return (jpeg, size) cropped to the subject, or the full frame"""
+    if not (CROP_TO_FACE and face_detector and frame.luma is not None):
+        return frame.jpeg, capture_size
     
-    with open(filename, "rb") as f:
-        image_base64 = base64.standard_b64encode(f.read()).decode("utf-8")
+    box = face_detector.detect_person(frame.luma)
+    if box is None:
+        print("No face found - uploading full frame")
+        return frame.jpeg, capture_size
     
-    os.remove(filename)
-    print("Photo captured!")
+    region = face_detect.crop_box(box, lores_size, capture_size,
+                                  CROP_PADDING, CROP_PADDING_BELOW)
+    return face_detect.crop_jpeg(frame.jpeg, region, CROP_MAX_SIZE, rate_control.quality)
+
+
+def capture_image(frame, press_time):
+    """Return a selected frame (cropped to the subject) as base64"""
+    jpeg, size = crop_frame(frame)
+    image_base64 = base64.standard_b64encode(jpeg).decode("utf-8")
+    offset_ms = (frame.timestamp - press_time) * 1000
+    tokens = image_shaping.estimate_vision_tokens(*size)
+    print(f"Photo captured! ({size[0]}x{size[1]}, {len(jpeg) // 1024} KB, ~{tokens} tokens, "
+          f"{offset_ms:+.0f} ms from press)")
     return image_base64
 
 
 # ==================== AI ====================
 
-def get_ai_response(image_base64):
-    """Send image to OpenRouter and get response"""
-    global current_mode
-    
-    headers = {
+def api_headers():
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://therapy-robot.local",
         "X-Title": "Therapy Robot"
     }
+
+
+class AIError(Exception):
+    """The API returned an error status"""
+
+
+def build_ai_request(image_base64, stream=False, mode=None, model=None):
+    """Build headers and payload for an OpenRouter chat completion"""
+    headers = api_headers()
+    mode = mode or current_mode
     
     prompt_text = "What do you see? " + (
-        "Please offer some gentle reassurance." if current_mode == MODE_THERAPY
+        "Please offer some gentle reassurance." if mode == MODE_THERAPY
         else "Roast this person."
     )
     
     payload = {
-        "model": MODEL,
+        "model": model or MODEL,
         "messages": [
             {
                 "role": "system",
-                "content": PROMPTS[current_mode]
+                "content": PROMPTS[mode]
             },
             {
                 "role": "user",
@@ -119,63 +402,412 @@ def get_ai_response(image_base64):
         ],
         "max_tokens": 150
     }
+    if stream:
+        payload["stream"] = True
     
-    try:
-        print(f"Sending to AI (mode: {current_mode})...")
-        response = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=30)
-        
+    return headers, payload
+
+
+def request_completion(image_base64, mode, model, attempt=None, trace=None):
+    """Blocking completion from one model; raises on failure"""
+    headers, payload = build_ai_request(image_base64, mode=mode, model=model)
+    
+    print(f"Sending to {model} (mode: {mode})...")
+    start = time.monotonic()
+    if trace:
+        trace.mark("upload")
+    # stream=True so a hedged loser can be cut off by closing the response
+    response = api_client.post(OPENROUTER_URL, headers=headers, json=payload,
+                               timeout=AI_TIMEOUT, stream=True)
+    if attempt:
+        attempt.response = response
+        if attempt.cancelled.is_set():
+            # Lost the race before the headers arrived, so cancel() had
+            # nothing to close: don't read a body only to throw it away
+            response.close()
+            return None
+    
+    with response:
+        print(f"HTTP ({model}): {api_client.last_timing}")
         if response.status_code != 200:
-            print(f"API Error: {response.status_code}")
-            print(response.text)
-            return "I'm having trouble thinking right now."
-        
+            raise AIError(f"{model}: {response.status_code} {response.text[:200]}")
         result = response.json()
-        return result["choices"][0]["message"]["content"]
     
+    elapsed = time.monotonic() - start
+    usage = result.get("usage") or {}
+    print(f"AI round trip ({model}): {elapsed * 1000:.0f} ms, "
+          f"image {len(image_base64) // 1024} KB base64, "
+          f"prompt tokens: {usage.get('prompt_tokens', '?')}")
+    
+    if attempt and not attempt.claim():
+        return None
+    if trace:
+        trace.mark("first_token")
+        trace.mark("last_token")
+    return result["choices"][0]["message"]["content"]
+
+
+def stream_completion(image_base64, mode, model, on_sentence, cancelled=None, attempt=None,
+                      trace=None):
+    """
+    Stream one model's completion, calling on_sentence() per sentence.
+    With an attempt, the first token claims the race; a loser stops quietly.
+    """
+    headers, payload = build_ai_request(image_base64, stream=True, mode=mode, model=model)
+    splitter = ai_stream.SentenceSplitter()
+    sentences = []
+    
+    def stopped():
+        return ((cancelled is not None and cancelled.is_set())
+                or (attempt is not None and attempt.cancelled.is_set()))
+    
+    print(f"Streaming from {model} (mode: {mode})...")
+    start = time.monotonic()
+    first_token = None
+    if trace:
+        trace.mark("upload")
+    
+    response = api_client.post(OPENROUTER_URL, headers=headers, json=payload,
+                               timeout=AI_TIMEOUT, stream=True)
+    if attempt:
+        attempt.response = response
+    
+    with response:
+        print(f"HTTP ({model}): {api_client.last_timing}")
+        if response.status_code != 200:
+            raise AIError(f"{model}: {response.status_code} {response.text[:200]}")
+        
+        for delta in ai_stream.iter_sse_deltas(response):
+            if stopped():
+                print(f"AI stream from {model} cancelled")
+                return None
+            if first_token is None:
+                first_token = time.monotonic() - start
+                if attempt and not attempt.claim():
+                    return None
+                if trace:
+                    trace.mark("first_token")
+            for sentence in splitter.feed(delta):
+                sentences.append(sentence)
+                on_sentence(sentence)
+    
+    rest = splitter.flush()
+    if rest:
+        sentences.append(rest)
+        on_sentence(rest)
+    if attempt and first_token is None and not attempt.claim():
+        return None
+    if trace:
+        trace.mark("last_token")
+    
+    elapsed = time.monotonic() - start
+    ttft = f"{first_token * 1000:.0f} ms" if first_token is not None else "n/a"
+    print(f"AI stream ({model}): first token {ttft}, done {elapsed * 1000:.0f} ms, "
+          f"{len(sentences)} sentences")
+    return " ".join(sentences)
+
+
+def pick_models(mode):
+    """Return (primary, fallback) for this request"""
+    if router is None:
+        return MODEL, FALLBACK_MODEL
+    
+    primary, reason = router.choose(mode)
+    print(f"Router: {primary} ({reason})")
+    return primary, router.fallback_for(mode, primary)
+
+
+def record_outcomes(mode, outcomes):
+    if router is None:
+        return
+    for model, latency, status in outcomes:
+        if status == "cancelled":
+            continue  # abandoned with the ROAST, says nothing about the model
+        # A cancelled loser's time is a lower bound, still worth keeping;
+        # the router records a failure at its timeout penalty
+        router.record(mode, model, latency, ok=status != "failed")
+
+
+def run_ai_call(call, mode, trace=None, cancelled=None):
+    """
+    Run call(model, attempt) on the routed model, hedged if enabled.
+    Raises hedging.Cancelled if `cancelled` is set before an answer.
+    """
+    primary, fallback = pick_models(mode)
+    try:
+        result = hedger.run(call, primary=primary, fallback=fallback, cancelled=cancelled)
+    except Exception as e:
+        record_outcomes(mode, getattr(e, "outcomes", []))
+        raise
+    
+    record_outcomes(mode, result.outcomes)
+    if trace:
+        trace.info["model"] = result.model
+        trace.info["hedged"] = result.hedged
+    if result.hedged:
+        stats = hedger.stats
+        print(f"Hedge: {result} | {stats['hedged']}/{stats['requests']} hedged, "
+              f"{stats['fallback_wins']} fallback wins, {stats['saved']:.1f}s saved total")
+    else:
+        print(f"AI: {result}")
+    return result.value
+
+
+def get_ai_response(image_base64, mode=None, trace=None, cancelled=None):
+    """Send image to OpenRouter and get response ("" if cancelled)"""
+    mode = mode or current_mode
+    
+    try:
+        return run_ai_call(
+            lambda model, attempt: request_completion(image_base64, mode, model, attempt, trace),
+            mode, trace, cancelled
+        )
+    
+    except hedging.Cancelled:
+        print("AI request cancelled")
+        return ""
+    except AIError as e:
+        print(f"API Error: {e}")
+        return API_ERROR_RESPONSE
     except Exception as e:
         print(f"Error: {e}")
-        return "Something went wrong with my brain."
+        return BRAIN_ERROR_RESPONSE
+
+
+def stream_ai_response(image_base64, on_sentence, cancelled=None, mode=None, trace=None):
+    """
+    Stream a completion from OpenRouter, calling on_sentence() for each
+    complete sentence as it arrives. Returns the full response text.
+    Stops early if the `cancelled` event gets set.
+    """
+    mode = mode or current_mode
+    sent = []
+    
+    def emit(sentence):
+        sent.append(sentence)
+        on_sentence(sentence)
+    
+    try:
+        run_ai_call(
+            lambda model, attempt: stream_completion(
+                image_base64, mode, model, emit, cancelled, attempt, trace),
+            mode, trace, cancelled
+        )
+    
+    except hedging.Cancelled:
+        print("AI stream cancelled")
+    except AIError as e:
+        print(f"API Error: {e}")
+        if not sent:
+            emit(API_ERROR_RESPONSE)
+    except Exception as e:
+        print(f"Error: {e}")
+        if not sent:
+            emit(BRAIN_ERROR_RESPONSE)
+    
+    return " ".join(sent)
 
 
 # ==================== COMMAND HANDLING ====================
 
-def handle_command(cmd, ser):
-    global current_mode
+def run_roast(job):
+    """Run one ROAST, recording its trace"""
+    if not TRACING:
+        # The ID still goes with every line, so the laptop can tell which
+        # sentences belong to this ROAST
+        job.trace_id = tracing.new_trace_id()
+        roast(job, None)
+        return
     
-    cmd = cmd.strip().upper()
-    print(f"\n>>> Command received: {cmd}")
+    trace = tracing.Trace(side="pi", start=job.received)
+    trace.info["mode"] = current_mode
+    job.trace_id = trace.id
+    try:
+        roast(job, trace)
+    finally:
+        trace_log.write(trace)
+        print(f"Trace {trace.id}: {trace.since('received') * 1000:.0f} ms on the Pi")
+
+
+def roast(job, trace):
+    """Grab the buffered frame closest to the press and get AI response"""
+    def emit(text):
+        sent = job.emit(text)
+        if sent and trace:
+            trace.mark("uart_write")
+        return sent
     
-    if cmd == "ROAST":
-        # Take photo and get AI response
-        print("Taking photo...")
-        image_base64 = capture_image()
-        
-        print("Getting AI response...")
-        response = get_ai_response(image_base64)
-        
-        print(f"AI says: {response}")
+    def stage(name):
+        if trace:
+            trace.mark(name)
+    
+    def source(name):
+        if trace:
+            trace.info["source"] = name
+    
+    press_time = time.monotonic()
+    print("Taking photo...")
+    frame, reject_reason = select_frame(press_time)
+    stage("capture")
+    
+    if frame is None:
+        source("rejected")
+        response = REJECT_RESPONSES.get(reject_reason, "I can't see anything right now.")
+        print(f"Skipping AI call ({reject_reason}): {response}")
+        emit(response)
+        return
+    
+    mode = current_mode
+    phash = None
+    if frame.luma is not None:
+        phash = response_cache.dhash(frame.luma)
+    
+    if RESPONSE_CACHE and phash is not None:
+        cached = response_cache_store.get(phash, mode)
+        if cached:
+            print(f"AI says (cached): {cached}")
+            source("cached")
+            send_response(emit, cached)
+            print_cache_stats()
+            return
+    
+    if prefetcher and phash is not None:
+        prefetched = prefetcher.take(mode, phash)
+        if prefetched:
+            print(f"AI says (prefetched): {prefetched}")
+            source("prefetched")
+            send_response(emit, prefetched)
+            if RESPONSE_CACHE:
+                response_cache_store.put(phash, mode, prefetched)
+            return
+    
+    if job.cancelled.is_set():
+        # TOGGLE (or a restarted ROAST) got in first: don't pay for the call
+        print("ROAST cancelled before the AI call")
+        source("cancelled")
+        return
+    
+    image_base64 = capture_image(frame, press_time)
+    stage("encode")
+    source("ai")
+    
+    print("Getting AI response...")
+    if STREAM_RESPONSES:
+        def send_sentence(sentence):
+            if emit(sentence):
+                print(f"  → {sentence}")
         
+        response = stream_ai_response(image_base64, send_sentence, job.cancelled,
+                                      mode=mode, trace=trace)
+    else:
+        response = get_ai_response(image_base64, mode=mode, trace=trace,
+                                   cancelled=job.cancelled)
+    
+    if job.cancelled.is_set():
+        # Whatever arrived may be cut short (and for the old mode): don't
+        # log it for dictionary training or cache it as a variant
+        print(f"ROAST cancelled during the AI call: {response or '(nothing sent)'}")
+        source("cancelled")
+        return
+    
+    print(f"AI says: {response}")
+    if not STREAM_RESPONSES:
         # Send response back to ESP32
-        ser.write(f"{response}\n".encode())
-        print("Response sent to ESP32")
-        
-    elif cmd == "TOGGLE":
-        # Switch modes
-        if current_mode == MODE_THERAPY:
-            current_mode = MODE_EVIL
-        else:
-            current_mode = MODE_THERAPY
-        
-        print(f"Mode switched to: {current_mode.upper()}")
-        ser.write(f"MODE:{current_mode}\n".encode())
+        if emit(response):
+            print("Response sent to ESP32")
+    
+    if is_real_response(response):
+        log_response(mode, response)
+    
+    if RESPONSE_CACHE and phash is not None and is_real_response(response):
+        response_cache_store.put(phash, mode, response)
+        print_cache_stats()
+
+
+def is_real_response(response):
+    return bool(response) and response not in (API_ERROR_RESPONSE, BRAIN_ERROR_RESPONSE)
+
+
+def log_response(mode, response):
+    if not RESPONSE_LOG:
+        return
+    try:
+        with open(RESPONSE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.time(), "mode": mode, "text": response}) + "\n")
+    except OSError as e:
+        print(f"Could not log response: {e}")
+
+
+def prefetch_response(frame, mode):
+    """Blocking AI call used by the prefetcher; None on failure"""
+    image_base64 = capture_image(frame, frame.timestamp)
+    response = get_ai_response(image_base64, mode=mode)
+    return response if is_real_response(response) else None
+
+
+def start_prefetcher():
+    global prefetcher
+    if face_detector is None:
+        return
     
+    prefetcher = face_prefetch.FacePrefetcher(
+        frame_buffer, face_detector, prefetch_response, lambda: current_mode,
+        stable_seconds=PREFETCH_STABLE_SECONDS,
+        max_age=PREFETCH_MAX_AGE,
+        max_wait=PREFETCH_MAX_WAIT,
+        max_per_hour=PREFETCH_MAX_PER_HOUR,
+    )
+    prefetcher.start()
+    print("Face prefetch running")
+
+
+def send_response(emit, response):
+    """Send a complete response, split into sentences when streaming"""
+    if not STREAM_RESPONSES:
+        emit(response)
+        return
+    
+    splitter = ai_stream.SentenceSplitter()
+    for sentence in splitter.feed(response + " "):
+        emit(sentence)
+    rest = splitter.flush()
+    if rest:
+        emit(rest)
+
+
+def print_cache_stats():
+    stats = response_cache_store.stats()
+    print(f"Cache: {stats['hits']} hits / {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%}), {stats['entries']} entries")
+
+
+def toggle_mode():
+    """Switch modes and return the line to send back"""
+    global current_mode
+    
+    if current_mode == MODE_THERAPY:
+        current_mode = MODE_EVIL
     else:
-        print(f"Unknown command: {cmd}")
+        current_mode = MODE_THERAPY
+    
+    print(f"Mode switched to: {current_mode.upper()}")
+    return f"MODE:{current_mode}"
+
+
+def create_engine(ser):
+    engine = command_engine.CommandEngine(ser, policy=ROAST_POLICY, encoder=link_encoder)
+    engine.register_job("ROAST", run_roast)
+    engine.register_instant("TOGGLE", toggle_mode,
+                            cancels=["ROAST"] if TOGGLE_CANCELS_ROAST else [],
+                            msg_type=link_protocol.TYPE_MODE)
+    return engine
 
 
 # ==================== MAIN ====================
 
 def main():
+    global face_detector
+    
     # Check API key
     if OPENROUTER_API_KEY == "your-api-key-here":
         print("=" * 50)
@@ -187,6 +819,17 @@ def main():
     # Initialize camera
     init_camera()
     
+    if CROP_TO_FACE or PREFETCH:
+        face_detector = face_detect.load_detector()
+    
+    # Open the API connection now so the first ROAST doesn't pay for it
+    print("Warming up API connection...")
+    api_client.warm_up(OPENROUTER_WARMUP_URL, headers=api_headers())
+    api_client.start_keepalive(OPENROUTER_WARMUP_URL, headers=api_headers())
+    
+    if PREFETCH:
+        start_prefetcher()
+    
     # Open serial port
     print(f"Opening serial port {SERIAL_PORT}...")
     try:
@@ -210,18 +853,21 @@ def main():
     print()
     
     try:
-        while True:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', errors='ignore')
-                if line.strip():
-                    handle_command(line, ser)
-            
-            time.sleep(0.01)
+        asyncio.run(create_engine(ser).run())
     
     except KeyboardInterrupt:
         print("\nShutting down...")
     finally:
         ser.close()
+        if prefetcher:
+            prefetcher.stop()
+            print(f"Prefetch: {prefetcher.stats()}")
+        if router:
+            router.save()
+            for mode in (MODE_THERAPY, MODE_EVIL):
+                print(f"Router [{mode}]: {router.summary(mode)}")
+        api_client.close()
+        stop_capture()
         if camera:
             camera.stop()
             camera.close()
@@ -0,0 +1,141 @@
+"""
+Therapy Robot - Perceptual-hash response cache
+
+When the same person keeps pressing ROAST, the frames are nearly
+identical. Each frame is reduced to a 64-bit dHash (computed with NumPy
+on the low-res luma plane). A cached response is reused if a stored hash
+for the same mode is within a Hamming distance threshold. Each entry
+keeps a small pool of response variants so repeats don't sound
+identical.
+"""
+
+import collections
+import random
+import threading
+import time
+
+import numpy as np
+
+
+def dhash(luma, hash_size=8):
+    """64-bit difference hash of a 2-D uint8 luma array"""
+    h, w = luma.shape
+    # Block-average down to (hash_size) x (hash_size + 1) without OpenCV
+    rows = np.linspace(0, h, hash_size + 1, dtype=int)
+    cols = np.linspace(0, w, hash_size + 2, dtype=int)
+    sums = np.add.reduceat(np.add.reduceat(luma.astype(np.float32), rows[:-1], axis=0),
+                           cols[:-1], axis=1)
+    small = sums / np.outer(np.diff(rows), np.diff(cols))
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class CacheEntry:
+    __slots__ = ("phash", "mode", "variants", "created", "served")
+
+    def __init__(self, phash, mode, response):
+        self.phash = phash
+        self.mode = mode
+        self.variants = [response]
+        self.created = time.monotonic()
+        self.served = 0
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of AI responses keyed by (perceptual hash, mode).
+
+    With max_variants > 1, a hit only reuses a response once the entry
+    already holds that many variants; until then the caller is told to
+    generate a fresh one and add it to the pool.
+    """
+
+    def __init__(self, max_entries=32, ttl=120.0, max_distance=6, max_variants=1):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_variants = max_variants
+
+        self._entries = collections.OrderedDict()  # id -> CacheEntry, LRU order
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _find(self, phash, mode):
+        now = time.monotonic()
+        best_id, best_dist = None, None
+        for entry_id, entry in list(self._entries.items()):
+            if now - entry.created > self.ttl:
+                del self._entries[entry_id]
+                self.expired += 1
+                continue
+            if entry.mode != mode:
+                continue
+            dist = hamming(entry.phash, phash)
+            if dist <= self.max_distance and (best_dist is None or dist < best_dist):
+                best_id, best_dist = entry_id, dist
+        return best_id, best_dist
+
+    def get(self, phash, mode):
+        """Return a cached response for a near-duplicate frame, or None"""
+        with self._lock:
+            entry_id, dist = self._find(phash, mode)
+            if entry_id is None:
+                self.misses += 1
+                return None
+
+            entry = self._entries[entry_id]
+            if len(entry.variants) < self.max_variants:
+                # Still filling the variant pool - treat as a miss
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            # Serve variants round-robin, starting from a random one
+            if entry.served == 0:
+                entry.served = random.randrange(len(entry.variants))
+            response = entry.variants[entry.served % len(entry.variants)]
+            entry.served += 1
+            self.hits += 1
+            print(f"Cache hit (distance {dist}, {len(entry.variants)} variants)")
+            return response
+
+    def put(self, phash, mode, response):
+        """Store a response, adding it as a variant to a near-duplicate entry"""
+        with self._lock:
+            entry_id, _ = self._find(phash, mode)
+            if entry_id is not None:
+                entry = self._entries[entry_id]
+                if response not in entry.variants and len(entry.variants) < self.max_variants:
+                    entry.variants.append(response)
+                self._entries.move_to_end(entry_id)
+                return
+
+            self._entries[self._next_id] = CacheEntry(phash, mode, response)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,93 @@
+"""
+Therapy Robot - Event-driven serial line reader
+
+Shared by the Pi controller and the laptop audio scripts. Instead of
+polling `in_waiting` every 10 ms and calling readline() one line at a
+time, the reader blocks in select() on the port's file descriptor, pulls
+everything available into one reusable buffer, and decodes it with an
+incremental UTF-8 decoder so characters split across reads (emoji,
+accents) survive.
+
+On platforms without select() on serial ports (Windows) it falls back to
+a blocking read with the port's timeout.
+
+With a recorder (serial_record.SessionRecorder) every raw chunk read is
+also logged with its arrival time for later replay.
+"""
+
+import codecs
+import io
+import select
+
+READ_SIZE = 4096
+
+
+class LineReader:
+    """Splits a serial byte stream into text lines"""
+
+    def __init__(self, ser, read_size=READ_SIZE, recorder=None):
+        self.ser = ser
+        self.recorder = recorder
+        self._buffer = bytearray(read_size)
+        self._view = memoryview(self._buffer)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._partial = ""
+
+        # Read straight into our buffer from the fd when we can
+        try:
+            self._fd = ser.fileno()
+            self._raw = io.FileIO(self._fd, "rb", closefd=False)
+        except Exception:
+            self._fd = None
+            self._raw = None
+
+    def fileno(self):
+        return self._fd
+
+    def _read_chunk(self):
+        """Read whatever is available without blocking; returns a memoryview"""
+        if self._raw is not None:
+            try:
+                n = self._raw.readinto(self._view)
+            except BlockingIOError:
+                return self._view[:0]
+            if n == 0:
+                raise EOFError("serial port closed")
+            return self._view[:n or 0]
+
+        waiting = self.ser.in_waiting
+        if not waiting:
+            return self._view[:0]
+        return memoryview(self.ser.read(min(waiting, len(self._buffer))))
+
+    def feed(self, data):
+        """Decode a chunk of bytes and return any completed lines"""
+        if self.recorder is not None:
+            self.recorder.write(data)
+        text = self._partial + self._decoder.decode(data)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return [line.rstrip("\r") for line in lines]
+
+    def read_available(self):
+        """Non-blocking: consume what's in the port now and return full lines"""
+        return self.feed(self._read_chunk())
+
+    def read_lines(self, timeout=None):
+        """Block until data arrives (or timeout) and return full lines"""
+        if self._fd is not None:
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return []
+            return self.read_available()
+
+        # No fd to wait on: a blocking read honours ser.timeout instead
+        data = self.ser.read(1)
+        if not data:
+            return []
+        return self.feed(data) + self.read_available()
+
+    def lines(self, timeout=1.0):
+        """Generator yielding lines forever"""
+        while True:
+            yield from self.read_lines(timeout)
@@ -0,0 +1,78 @@
+"""
+Therapy Robot - Serial session recording
+
+Captures every raw byte read from a serial port, with monotonic
+timestamps, to a compact binary log so venue sessions can be replayed
+later (tools/replay_session.py).
+
+Log format: the 8-byte header b"TRSESS01", then one record per read:
+
+    <f8 seconds since recording started> <u4 length> <length bytes>
+
+(little-endian). Each record is flushed to the OS as it arrives, so
+a crash of the script loses nothing; serial traffic is a few hundred
+bytes a second, so the extra writes cost nothing.
+"""
+
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"TRSESS01"
+RECORD = struct.Struct("<dI")
+
+
+class SessionRecorder:
+    """Appends timestamped chunks of raw serial input to a log file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.bytes = 0
+
+    def write(self, data):
+        if not data:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(RECORD.pack(now - self._start, len(data)) + bytes(data))
+            self._file.flush()
+            self.chunks += 1
+            self.bytes += len(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def session_path(directory):
+    """A new timestamped log path in `directory`"""
+    return os.path.join(directory, time.strftime("session-%Y%m%d-%H%M%S.bin"))
+
+
+def read_session(path):
+    """Yield (seconds, bytes) for every record in a session log"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return  # end of file (or a record cut off by a crash)
+            offset, length = RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield offset, data
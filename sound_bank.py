@@ -0,0 +1,78 @@
+"""
+Therapy Robot - Preloaded sound effects
+
+Local effect files (the 67 emote) are decoded into pygame Sounds once at
+startup and played on mixer channels of their own, so they start
+instantly and play over speech instead of queueing behind it.
+
+While an effect plays the speech outputs can be ducked (turned down to
+duck_volume); they are restored when the last effect ends.
+"""
+
+import threading
+import time
+
+import pygame
+
+
+class SoundBank:
+    """Named in-memory Sounds played on a dedicated set of mixer channels"""
+
+    def __init__(self, channels, duck=(), duck_volume=1.0):
+        self.channels = list(channels)
+        self.duck = list(duck)          # things with set_volume(), e.g. the speech channel
+        self.duck_volume = duck_volume  # 1.0 = no ducking
+        self.sounds = {}
+        self._lock = threading.Lock()
+        self._restore_at = 0.0
+        self._timer = None
+
+    def load(self, name, path):
+        """Decode a file into memory; returns False if it can't be loaded"""
+        try:
+            self.sounds[name] = pygame.mixer.Sound(path)
+        except (pygame.error, OSError) as e:
+            print(f"⚠️ Can't load sound '{name}' from {path}: {e}")
+            return False
+        return True
+
+    def play(self, name):
+        """Start a sound now; returns its Channel, or None if it isn't loaded"""
+        sound = self.sounds.get(name)
+        if sound is None:
+            return None
+        with self._lock:
+            # A free effect channel, else cut off the first one
+            channel = next((c for c in self.channels if not c.get_busy()), self.channels[0])
+            channel.play(sound)
+            if self.duck_volume < 1.0:
+                self._duck(sound.get_length())
+        return channel
+
+    def _duck(self, seconds):
+        for target in self.duck:
+            target.set_volume(self.duck_volume)
+        self._restore_at = max(self._restore_at, time.monotonic() + seconds)
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(self._restore_at - time.monotonic(), self._unduck)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _unduck(self):
+        with self._lock:
+            if time.monotonic() < self._restore_at - 0.05:
+                return   # a later effect extended the duck
+            for target in self.duck:
+                target.set_volume(1.0)
+            self._timer = None
+
+    def stop(self):
+        with self._lock:
+            for channel in self.channels:
+                channel.stop()
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            for target in self.duck:
+                target.set_volume(1.0)
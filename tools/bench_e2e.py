@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - Hardware-free end-to-end benchmark
+
+Runs the real pi_controller and a laptop audio controller in one process
+against stand-ins for everything else:
+
+  - tools/fake_hardware.py: Picamera2 serving recorded (or synthetic) frames
+  - tools/fake_services.py: local OpenRouter + ElevenLabs with latency
+    distributions
+  - pty pairs for the two serial links, joined by a fake ESP32 pair that
+    forwards lines like the robot and gateway firmware (244-byte
+    ESP-NOW messages, UART airtime, 2.4 s emote)
+  - pygame's dummy audio driver on the laptop side
+
+A scripted ROAST/TOGGLE/EMOTE sequence is played in, and the ROAST trace
+logs (see tracing.py) are merged into per-stage p50/p95/p99 tables along
+with throughput, emote latency and service counters.
+
+Script files have one command per line: ROAST, TOGGLE, EMOTE or
+WAIT <seconds>; # starts a comment.
+
+Run:
+  python3 tools/bench_e2e.py
+  python3 tools/bench_e2e.py --roasts 30 --interval 1.5 --ttft lognormal:2:0.6
+  python3 tools/bench_e2e.py --model-ttft anthropic/claude-3.5-sonnet=lognormal:4:0.5
+  python3 tools/bench_e2e.py --script venue.txt --frames recorded/ --json before.json
+  python3 tools/bench_e2e.py --laptop none      # Pi side only, no pygame needed
+"""
+
+import argparse
+import importlib
+import json
+import os
+import pty
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "robot"))
+
+import serial
+
+import fake_hardware
+import fake_services
+import tracing
+import trace_report
+import tts_cache
+from serial_lines import LineReader
+
+BAUD_RATE = 115200
+ESPNOW_MAX = 244            # Message.command is char[245]
+ESPNOW_DELAY = 0.004        # one ESP-NOW hop, seconds
+EMOTE_SECONDS = 2.4         # doEmote67(): 8 x 300 ms arm moves
+LAPTOPS = ("laptop_audio_67", "laptop_audio_elevenlabs", "none")
+
+
+def airtime(nbytes):
+    return nbytes * 10 / BAUD_RATE
+
+
+def open_pty():
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    return master, os.ttyname(slave), slave
+
+
+class FakeESP32s:
+    """Robot ESP32 + gateway ESP32: forwards commands and Pi output"""
+
+    def __init__(self, pi_master, laptop_master):
+        self.pi_master = pi_master
+        self.laptop_master = laptop_master   # None: nobody listening
+        self.lines = 0
+        self.bytes = 0
+        self.truncated = 0
+        self.last_activity = time.monotonic()
+        self.presses = []                    # (command, time)
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _to_laptop(self, data):
+        self.last_activity = time.monotonic()
+        if self.laptop_master is None:
+            return
+        with self._write_lock:
+            time.sleep(airtime(len(data)))
+            os.write(self.laptop_master, data)
+
+    def press(self, command):
+        """A gateway button: echo to the laptop, send over ESP-NOW to the robot"""
+        self.presses.append((command, time.monotonic()))
+        self._to_laptop(f"Sent: {command}\r\n".encode())
+        time.sleep(ESPNOW_DELAY)
+        if command == "EMOTE":
+            threading.Thread(target=self._emote, daemon=True).start()
+        else:
+            line = f"{command}\r\n".encode()
+            time.sleep(airtime(len(line)))
+            os.write(self.pi_master, line)
+
+    def _emote(self):
+        time.sleep(EMOTE_SECONDS)
+        time.sleep(ESPNOW_DELAY)
+        self._to_laptop(b"EMOTE 67 DONE\r\n")
+
+    def _pi_reader(self):
+        """checkPiSerial(): one ESP-NOW message per line, truncated to fit"""
+        pending = b""
+        while not self._stop.is_set():
+            try:
+                data = os.read(self.pi_master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                line = line.rstrip(b"\r")
+                if not line:
+                    continue
+                self.lines += 1
+                self.bytes += len(line)
+                if len(line) > ESPNOW_MAX:
+                    self.truncated += 1
+                    line = line[:ESPNOW_MAX]
+                time.sleep(ESPNOW_DELAY)
+                self._to_laptop(line + b"\r\n")
+
+    def start(self):
+        threading.Thread(target=self._pi_reader, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# ---------- scripts ----------
+
+def default_script(roasts, interval, toggle_every, emote_every):
+    script = []
+    for i in range(1, roasts + 1):
+        script.append(("ROAST", None))
+        if toggle_every and i % toggle_every == 0:
+            script.append(("TOGGLE", None))
+        if emote_every and i % emote_every == 0:
+            script.append(("EMOTE", None))
+        script.append(("WAIT", interval))
+    return script
+
+
+def load_script(path):
+    script = []
+    with open(path) as f:
+        for raw in f:
+            line = raw.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            command = parts[0].upper()
+            if command == "WAIT":
+                script.append(("WAIT", float(parts[1])))
+            elif command in ("ROAST", "TOGGLE", "EMOTE"):
+                script.append((command, None))
+            else:
+                raise ValueError(f"unknown script command: {line}")
+    return script
+
+
+# ---------- the two controllers ----------
+
+def start_pi(args, services, port, trace_path):
+    fake_hardware.install(args.frames)
+    import model_router
+    import pi_controller as pc
+
+    pc.OPENROUTER_API_KEY = "bench"
+    pc.OPENROUTER_URL = services.url + "/api/v1/chat/completions"
+    pc.OPENROUTER_WARMUP_URL = services.url + "/api/v1/auth/key"
+    pc.SERIAL_PORT = port
+    pc.RESPONSE_CACHE = args.cache
+    pc.RESPONSE_LOG = None
+    pc.TRACING = True
+    pc.trace_log = tracing.TraceLog(trace_path)
+    if pc.router:
+        # Fresh stats, nothing read from or written to router_state.json
+        pc.router = model_router.ModelRouter(
+            pc.MODEL_POOL, target=pc.TARGET_LATENCY, confidence=pc.ROUTER_CONFIDENCE,
+            explore=pc.ROUTER_EXPLORE, failure_penalty=pc.AI_TIMEOUT,
+            max_error_rate=pc.ROUTER_MAX_ERROR_RATE, state_file=None)
+
+    # Count ROASTs still running, including cancelled ones that are
+    # finishing in the background
+    active = []
+    run_roast = pc.run_roast
+
+    def counted_run_roast(job):
+        active.append(job)
+        try:
+            run_roast(job)
+        finally:
+            active.remove(job)
+
+    pc.run_roast = counted_run_roast
+
+    threading.Thread(target=pc.main, daemon=True).start()
+    deadline = time.monotonic() + 15
+    while pc.frame_buffer.latest() is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.5)   # let main() open the port and start the engine
+    return pc, active
+
+
+def start_laptop(args, services, port, trace_path):
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        laptop = importlib.import_module(args.laptop)
+    except ImportError as e:
+        print(f"Can't load {args.laptop}: {e}  (use --laptop none for the Pi side only)")
+        sys.exit(1)
+
+    tts = laptop.elevenlabs_tts
+    tts.ELEVENLABS_API_KEY = "bench"
+    tts.ELEVENLABS_URL = services.url + "/v1/text-to-speech"
+    # Never let the stand-in's audio into the real TTS cache
+    tts.TTS_CACHE = args.tts_cache
+    if args.tts_cache:
+        tts.tts_cache_store = tts_cache.TTSCache(
+            os.path.join(os.path.dirname(trace_path), "tts_cache"))
+    laptop.TRACING = True
+    laptop.trace_log = tracing.TraceLog(trace_path)
+
+    emote_starts = []
+    if hasattr(laptop, "play_local_audio"):
+        laptop.EMOTE_67_AUDIO = os.path.join(ROOT, "67_emote.mp3")
+        play_local_audio = laptop.play_local_audio
+
+        def timed_play_local_audio(path):
+            emote_starts.append(time.monotonic())
+            return play_local_audio(path)
+
+        laptop.play_local_audio = timed_play_local_audio
+
+    if hasattr(laptop, "init_audio"):
+        laptop.init_audio()
+        work_queue = laptop.audio_queue
+        if getattr(laptop, "SOUND_BANK", False):
+            # Emotes play straight from the sound bank, off the audio queue
+            deadline = time.monotonic() + 5
+            while laptop.effects is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if laptop.effects:
+                bank_play = laptop.effects.play
+
+                def timed_bank_play(name):
+                    channel = bank_play(name)
+                    if channel:
+                        emote_starts.append(time.monotonic())
+                    return channel
+
+                laptop.effects.play = timed_bank_play
+    else:
+        laptop.init_tts()
+        work_queue = laptop.speech_queue
+    laptop.set_mode("evil")
+
+    ser = serial.Serial(port, BAUD_RATE, timeout=0.5)
+
+    def reader_loop():
+        reader = LineReader(ser)
+        while True:
+            try:
+                lines = reader.read_lines(timeout=0.5)
+            except (OSError, EOFError):
+                return
+            for line in lines:
+                laptop.handle_line(line)
+
+    threading.Thread(target=reader_loop, daemon=True).start()
+    return laptop, work_queue, emote_starts
+
+
+# ---------- report ----------
+
+def stage_table(traces):
+    rows = {}
+    for label, start, end in trace_report.SEGMENTS:
+        values = [(t["stages"][end] - t["stages"][start]) * 1000
+                  for t in traces.values()
+                  if start in t["stages"] and end in t["stages"]]
+        if values:
+            rows[label] = {
+                "n": len(values),
+                "p50": trace_report.percentile(values, 50),
+                "p95": trace_report.percentile(values, 95),
+                "p99": trace_report.percentile(values, 99),
+            }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware-free end-to-end benchmark")
+    parser.add_argument("--script", help="command script (default: generated from the options below)")
+    parser.add_argument("--roasts", type=int, default=12)
+    parser.add_argument("--interval", type=float, default=4.0, help="seconds between ROASTs")
+    parser.add_argument("--toggle-every", type=int, default=4)
+    parser.add_argument("--emote-every", type=int, default=5)
+    parser.add_argument("--frames", help="directory of recorded JPEG frames (default: synthetic)")
+    parser.add_argument("--laptop", choices=LAPTOPS, default="laptop_audio_67")
+    parser.add_argument("--cache", action="store_true", help="leave the Pi's response cache on")
+    parser.add_argument("--tts-cache", action="store_true",
+                        help="use a fresh laptop TTS cache for the run (off by default)")
+    parser.add_argument("--ttft", default="lognormal:1.2:0.4", help="chat time to first token")
+    parser.add_argument("--model-ttft", action="append", metavar="MODEL=SPEC",
+                        help="per-model time to first token")
+    parser.add_argument("--token-interval", type=float, default=0.03)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-first-byte", default="lognormal:0.35:0.3")
+    parser.add_argument("--tts-rate", type=int, default=64000, help="TTS audio bytes per second")
+    parser.add_argument("--drain", type=float, default=60.0,
+                        help="max seconds to wait for speech to finish after the script")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    script = (load_script(args.script) if args.script else
+              default_script(args.roasts, args.interval, args.toggle_every, args.emote_every))
+
+    config = fake_services.ServiceConfig(
+        ttft=args.ttft, token_interval=args.token_interval, error_rate=args.error_rate,
+        model_ttft=fake_services.parse_model_latencies(args.model_ttft),
+        tts_first_byte=args.tts_first_byte, tts_bytes_per_second=args.tts_rate)
+    services = fake_services.FakeServices(config).start()
+
+    workdir = tempfile.mkdtemp(prefix="robot-bench-")
+    pi_trace = os.path.join(workdir, "trace_pi.jsonl")
+    laptop_trace = os.path.join(workdir, "trace_laptop.jsonl")
+
+    pi_master, pi_port, _ = open_pty()
+    laptop_master, laptop_port = None, None
+    if args.laptop != "none":
+        laptop_master, laptop_port, _ = open_pty()
+
+    esp = FakeESP32s(pi_master, laptop_master)
+    esp.start()
+
+    pc, active_roasts = start_pi(args, services, pi_port, pi_trace)
+    laptop, work_queue, emote_starts = None, None, []
+    if laptop_port:
+        laptop, work_queue, emote_starts = start_laptop(args, services, laptop_port, laptop_trace)
+
+    print(f"\n=== Running {sum(1 for c, _ in script if c != 'WAIT')} commands ===\n")
+    start = time.monotonic()
+    for command, arg in script:
+        if command == "WAIT":
+            time.sleep(arg)
+        else:
+            esp.press(command)
+
+    # Drain: wait for running ROASTs, the audio queue and the link to go quiet
+    drain_until = time.monotonic() + args.drain
+    while time.monotonic() < drain_until:
+        busy = active_roasts or (work_queue is not None and work_queue.unfinished_tasks > 0)
+        if not busy and time.monotonic() - esp.last_activity > 2.0:
+            break
+        time.sleep(0.1)
+    elapsed = time.monotonic() - start
+    esp.stop()
+
+    records = trace_report.load(pi_trace)
+    if laptop_port:
+        records += trace_report.load(laptop_trace)
+    traces = trace_report.merge(records)
+    answered = sum(1 for t in traces.values() if "uart_write" in t["stages"])
+    sources = {}
+    for t in traces.values():
+        source = t["info"].get("source", "?")
+        sources[source] = sources.get(source, 0) + 1
+    roasts = sum(1 for c, _ in script if c == "ROAST")
+    emote_presses = [t for c, t in esp.presses if c == "EMOTE"]
+    emote_ms = [(s - p) * 1000 for p, s in zip(emote_presses, emote_starts)]
+
+    results = {
+        "elapsed": elapsed,
+        "roasts_sent": roasts,
+        "roasts_started": len(traces),
+        "roasts_answered": answered,
+        "throughput_per_min": answered / elapsed * 60,
+        "sources": sources,
+        "link": {"lines": esp.lines, "bytes": esp.bytes, "truncated": esp.truncated},
+        "stages": stage_table(traces),
+        "emote_ms": {
+            "n": len(emote_ms),
+            "p50": trace_report.percentile(emote_ms, 50) if emote_ms else None,
+            "p95": trace_report.percentile(emote_ms, 95) if emote_ms else None,
+        },
+        "hedger": dict(pc.hedger.stats),
+        "services": dict(services.stats),
+        "tts_cache": (laptop.elevenlabs_tts.tts_cache_store.stats()
+                      if laptop and args.tts_cache else None),
+        "audio_scheduler": dict(getattr(work_queue, "stats", None) or {}),
+        "config": vars(args),
+    }
+
+    print(f"\n=== Results ({elapsed:.1f} s) ===\n")
+    print(f"ROASTs: {roasts} sent, {len(traces)} started, {answered} answered "
+          f"({results['throughput_per_min']:.1f}/min) {sources}")
+    print(f"Link: {esp.lines} lines, {esp.bytes} bytes, {esp.truncated} truncated")
+    print(f"Hedger: {results['hedger']}")
+    print(f"Services: {results['services']}")
+    if results["audio_scheduler"]:
+        print(f"Audio scheduler: {results['audio_scheduler']}")
+    if results["tts_cache"]:
+        print(f"TTS cache: {results['tts_cache']}")
+    if emote_ms:
+        print(f"Emote (press to audio): p50 {results['emote_ms']['p50']:.0f} ms, "
+              f"p95 {results['emote_ms']['p95']:.0f} ms (includes the {EMOTE_SECONDS}s arm routine)")
+    print()
+    print(f"{'stage':<18}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for label, row in results["stages"].items():
+        print(f"{label:<18}{row['n']:>6}{row['p50']:>8.0f}ms{row['p95']:>8.0f}ms{row['p99']:>8.0f}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+    print(f"Trace logs: {workdir}")
+
+    services.stop()
+    os._exit(0)   # controller threads block in serial reads and audio waits
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - Gap between clips benchmark
+
+Plays a run of short clips back to back and measures the dead air
+between them. A monitor thread samples the mixer every millisecond and
+records each stretch where nothing was playing between the first clip
+starting and the last one ending. Three paths are compared:
+
+  poll      the old way: mixer.music, then get_busy() every 100 ms
+  channel   playback.ChannelPlayer, each clip waited out to its end
+  gapless   playback.ChannelPlayer with the next clip queued CLIP_LEAD
+            seconds before the current one ends (what the laptop
+            controllers do now)
+
+Clips are generated tones, so no audio files are needed. Runs on SDL's
+dummy audio driver by default; pass --real-audio to use the sound card.
+
+Run:
+  python3 tools/bench_gaps.py
+  python3 tools/bench_gaps.py --clips 20 --length 0.3
+"""
+
+import argparse
+import array
+import io
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import playback
+
+SAMPLE_RATE = 22050
+CLIP_LEAD = 0.15
+
+
+def tone(seconds, freq=220):
+    samples = array.array("h", (int(3000 * math.sin(2 * math.pi * freq * i / SAMPLE_RATE))
+                                for i in range(int(seconds * SAMPLE_RATE))))
+    return samples.tobytes()
+
+
+def wav_bytes(pcm):
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+
+class Monitor:
+    """Samples a busy() callable every millisecond and collects idle gaps"""
+
+    def __init__(self, busy):
+        self.busy = busy
+        self.gaps = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        started = False
+        idle_since = None
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if self.busy():
+                if idle_since is not None and started:
+                    self.gaps.append(now - idle_since)
+                started = True
+                idle_since = None
+            elif started and idle_since is None:
+                idle_since = now
+            time.sleep(0.001)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_poll(pygame, clips, channel):
+    for data in clips:
+        pygame.mixer.music.load(io.BytesIO(wav_bytes(data)), "wav")
+        pygame.mixer.music.play()
+        while pygame.mixer.music.get_busy():
+            time.sleep(0.1)
+
+
+def run_channel(pygame, clips, channel, lead=0.0):
+    output = playback.ChannelPlayer(channel)
+    for data in clips:
+        output.submit(pygame.mixer.Sound(buffer=data))
+        output.wait(lead=lead)
+    output.wait()
+
+
+def run_gapless(pygame, clips, channel):
+    run_channel(pygame, clips, channel, lead=CLIP_LEAD)
+
+
+METHODS = [("poll", run_poll), ("channel", run_channel), ("gapless", run_gapless)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dead air between back-to-back clips")
+    parser.add_argument("--clips", type=int, default=10)
+    parser.add_argument("--length", type=float, default=0.5, help="seconds per clip")
+    parser.add_argument("--real-audio", action="store_true",
+                        help="use the real sound card instead of SDL's dummy driver")
+    args = parser.parse_args()
+
+    if not args.real_audio:
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    try:
+        import pygame
+    except ImportError:
+        print("pygame is not installed")
+        sys.exit(1)
+    pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=1)
+    pygame.mixer.set_reserved(1)
+    channel = pygame.mixer.Channel(0)
+
+    clips = [tone(args.length, 220 + 40 * (i % 4)) for i in range(args.clips)]
+    print(f"{args.clips} clips of {args.length:.2f} s\n")
+
+    print(f"{'path':<10}{'gaps':>6}{'p50':>10}{'max':>10}{'dead air':>12}")
+    for name, run in METHODS:
+        monitor = Monitor(lambda: pygame.mixer.music.get_busy() or channel.get_busy())
+        monitor.start()
+        run(pygame, clips, channel)
+        time.sleep(0.05)
+        monitor.stop()
+
+        gaps = [g * 1000 for g in monitor.gaps]
+        p50 = statistics.median(gaps) if gaps else 0.0
+        print(f"{name:<10}{len(gaps):>6}{p50:>8.1f}ms{max(gaps, default=0.0):>8.1f}ms"
+              f"{sum(gaps):>10.0f}ms")
+
+    pygame.mixer.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - TTS playback start benchmark
+
+Times how long it takes to go from an MP3 clip in memory (what the
+ElevenLabs request hands back) to audio playing, for:
+
+  tempfile   the original path: write a NamedTemporaryFile, load it
+             with pygame.mixer.music, play, unlink
+  memory     the interim path: pygame.mixer.music.load(BytesIO), no
+             temp file
+  channel    decode the whole clip to a pygame Sound and submit it to
+             playback.ChannelPlayer on channel 0 - what the laptop
+             controllers do now (elevenlabs_tts.play_tts_audio)
+
+Runs on SDL's dummy audio driver by default so it works headless; pass
+--real-audio to time against the sound card.
+
+Run:
+  python3 tools/bench_playback_start.py
+  python3 tools/bench_playback_start.py some_clip.mp3 --repeat 50
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import playback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CLIP = os.path.join(ROOT, "67_emote.mp3")
+
+# Set up in main() once the mixer is running
+speech_output = None
+
+
+def start_tempfile(pygame, audio_data):
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
+        f.write(audio_data)
+        temp_path = f.name
+    try:
+        pygame.mixer.music.load(temp_path)
+        pygame.mixer.music.play()
+    finally:
+        os.unlink(temp_path)
+
+
+def start_memory(pygame, audio_data):
+    pygame.mixer.music.load(io.BytesIO(audio_data), "mp3")
+    pygame.mixer.music.play()
+
+
+def start_channel(pygame, audio_data):
+    sound = pygame.mixer.Sound(file=io.BytesIO(audio_data))
+    speech_output.submit(sound)
+    return sound
+
+
+def stop_all(pygame):
+    pygame.mixer.music.stop()
+    pygame.mixer.music.unload()
+    speech_output.stop()
+    pygame.mixer.stop()
+
+
+METHODS = [
+    ("tempfile", start_tempfile),
+    ("memory", start_memory),
+    ("channel", start_channel),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bytes-in-hand to audio start")
+    parser.add_argument("clip", nargs="?", default=DEFAULT_CLIP, help="MP3 clip to play")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--real-audio", action="store_true",
+                        help="use the real sound card instead of SDL's dummy driver")
+    args = parser.parse_args()
+
+    if not args.real_audio:
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    try:
+        import pygame
+    except ImportError:
+        print("pygame is not installed")
+        sys.exit(1)
+    global speech_output
+    pygame.mixer.init()
+    # Same layout as elevenlabs_tts.init_output(): speech owns channel 0
+    pygame.mixer.set_reserved(1)
+    speech_output = playback.ChannelPlayer(pygame.mixer.Channel(0))
+
+    with open(args.clip, "rb") as f:
+        audio_data = f.read()
+    print(f"{os.path.basename(args.clip)}: {len(audio_data) // 1024} KB, {args.repeat} runs each\n")
+
+    print(f"{'path':<10}{'p50':>10}{'mean':>10}{'max':>10}")
+    for name, start in METHODS:
+        start(pygame, audio_data)   # warm-up: first decode loads codecs
+        stop_all(pygame)
+
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            start(pygame, audio_data)
+            times.append((time.perf_counter() - t0) * 1000)
+            stop_all(pygame)
+
+        print(f"{name:<10}{statistics.median(times):>8.2f}ms{statistics.mean(times):>8.2f}ms"
+              f"{max(times):>8.2f}ms")
+
+    pygame.mixer.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - Link dictionary builder
+
+Builds the preset deflate dictionary used by link_protocol compression
+from logged responses. Input files are JSONL (the Pi's
+robot/responses.jsonl, a "text" field per line) or plain text (one
+response per line).
+
+Picks the word sequences that would save the most bytes if deflate could
+point back at them, and writes them most-valuable-last (zlib matches the
+end of the dictionary cheapest). Copy the result to BOTH the Pi and the
+laptop; the dictionary ID in each compressed message makes a mismatch
+show up as dropped messages rather than garbage.
+
+Run:
+  python3 tools/build_link_dict.py robot/responses.jsonl
+  python3 tools/build_link_dict.py old_logs/*.jsonl --size 4096 -o link_dict.bin
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import link_protocol
+
+MAX_NGRAM = 8        # longest word sequence considered
+MIN_MATCH = 3        # deflate can't reference anything shorter
+
+
+def load_texts(paths):
+    texts = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    try:
+                        line = json.loads(line).get("text", "")
+                    except ValueError:
+                        continue
+                if line:
+                    texts.append(line)
+    return texts
+
+
+def count_ngrams(texts):
+    """Occurrences of every word n-gram (with its leading space)"""
+    counts = collections.Counter()
+    for text in texts:
+        words = text.split()
+        for n in range(1, MAX_NGRAM + 1):
+            for i in range(len(words) - n + 1):
+                gram = " ".join(words[i:i + n])
+                # Mid-sentence words are preceded by a space; include it
+                counts[(" " if i else "") + gram] += 1
+    return counts
+
+
+def build_dictionary(texts, size):
+    counts = count_ngrams(texts)
+    scored = []
+    for gram, count in counts.items():
+        length = len(gram.encode("utf-8"))
+        if count < 2 or length < MIN_MATCH + 1:
+            continue
+        # Each use after it's in the dictionary becomes a short back-reference
+        scored.append((count * (length - MIN_MATCH), gram))
+    scored.sort(reverse=True)
+
+    chosen = []
+    used = 0
+    for score, gram in scored:
+        if any(gram in other for _, other in chosen):
+            continue
+        length = len(gram.encode("utf-8"))
+        if used + length > size:
+            continue
+        chosen.append((score, gram))
+        used += length
+        if used >= size - MIN_MATCH:
+            break
+
+    # Least valuable first, so the best phrases sit right before the data
+    chosen.sort()
+    return "".join(gram for _, gram in chosen).encode("utf-8")[:size]
+
+
+def wire_bytes(texts, compressor):
+    encoder = link_protocol.Encoder(compressor=compressor)
+    return sum(len(frame) for text in texts for frame in encoder.encode(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the link compression dictionary")
+    parser.add_argument("inputs", nargs="+", help="JSONL or text files of past responses")
+    parser.add_argument("-o", "--output", default=link_protocol.DICT_FILE)
+    parser.add_argument("--size", type=int, default=2048, help="dictionary size in bytes (max 32768)")
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="fraction of responses kept back to evaluate the result")
+    args = parser.parse_args()
+
+    texts = load_texts(args.inputs)
+    if len(texts) < 10:
+        print(f"Only {len(texts)} responses; log some more first")
+        sys.exit(1)
+
+    rng = random.Random(0)
+    rng.shuffle(texts)
+    split = int(len(texts) * (1 - args.holdout))
+    train, test = texts[:split], texts[split:] or texts
+
+    zdict = build_dictionary(train, min(args.size, 32768))
+    with open(args.output, "wb") as f:
+        f.write(zdict)
+    print(f"Wrote {len(zdict)} byte dictionary from {len(train)} responses to {args.output}")
+
+    raw = wire_bytes(test, None)
+    print(f"Held-out set ({len(test)} responses), bytes on the wire:")
+    print(f"  {'uncompressed:':<22}{raw}")
+    for name, zd in (("built-in dictionary", link_protocol.DEFAULT_DICTIONARY), ("new dictionary", zdict)):
+        sent = wire_bytes(test, link_protocol.Compressor(zd))
+        print(f"  {name + ':':<22}{sent} ({sent / raw:.0%})")
+
+
+if __name__ == "__main__":
+    main()
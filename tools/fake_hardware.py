@@ -0,0 +1,157 @@
+"""
+Therapy Robot - Fake Picamera2 for benchmarks
+
+Implements the slice of the Picamera2 API that pi_controller uses
+(video configuration with main + lores streams, capture_request(),
+request.save() / make_array() / release()) on top of recorded frames:
+a directory of JPEGs, or synthetic frames if none are given. Frames are
+paced at the configured FrameDurationLimits like the real sensor.
+
+install() puts it in sys.modules as `picamera2` so pi_controller's own
+init_camera() picks it up unchanged.
+"""
+
+import glob
+import os
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_frames(count=24, size=(640, 480), seed=67):
+    """A person-ish bright blob drifting over a textured background"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w]
+    background = (60 + 80 * xx / w + 30 * np.sin(yy / 17.0)).astype(np.float32)
+    frames = []
+    for i in range(count):
+        cx = w / 2 + 40 * np.sin(i / 4.0)
+        cy = h / 2.4 + 10 * np.cos(i / 3.0)
+        face = ((xx - cx) / (w * 0.11)) ** 2 + ((yy - cy) / (h * 0.18)) ** 2 < 1
+        body = ((xx - cx) / (w * 0.22)) ** 2 + ((yy - h) / (h * 0.45)) ** 2 < 1
+        grey = background.copy()
+        grey[body] = 70
+        grey[face] = 190
+        grey += rng.normal(0, 12, grey.shape)
+        grey = np.clip(grey, 0, 255).astype(np.uint8)
+        rgb = np.stack([grey, np.clip(grey * 0.9, 0, 255).astype(np.uint8), grey], axis=-1)
+        frames.append(Image.fromarray(rgb, "RGB"))
+    return frames
+
+
+def load_frames(path):
+    files = sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.jpeg")))
+    if not files:
+        raise FileNotFoundError(f"no .jpg frames in {path}")
+    return [Image.open(f).convert("RGB") for f in files]
+
+
+class FakeRequest:
+    def __init__(self, camera, image):
+        self.camera = camera
+        self.image = image
+
+    def save(self, stream, buf, format="jpeg"):
+        self.camera.main_image(self.image).save(buf, format="JPEG",
+                                                quality=self.camera.options.get("quality", 85))
+
+    def make_array(self, stream):
+        if stream == "lores":
+            size, fmt = self.camera.config["lores"]["size"], "YUV420"
+        else:
+            size, fmt = self.camera.config["main"]["size"], self.camera.config["main"]["format"]
+        image = self.image.resize(size)
+        if fmt == "RGB888":
+            # Picamera2's RGB888 is BGR in memory
+            return np.asarray(image)[:, :, ::-1].copy()
+        # YUV420: Y plane followed by quarter-size U and V planes
+        y = np.asarray(image.convert("L"))
+        chroma = np.full((size[1] // 2, size[0]), 128, dtype=np.uint8)
+        return np.vstack([y, chroma])
+
+    def release(self):
+        pass
+
+
+class FakePicamera2:
+    """Stands in for picamera2.Picamera2"""
+
+    frames = None   # set by install()
+
+    def __init__(self, camera_num=0):
+        self.options = {"quality": 90}
+        self.config = None
+        self.started = False
+        self._index = 0
+        self._next = time.monotonic()
+        self._frame_time = 1 / 30
+        self._lock = threading.Lock()
+        self._sized = {}
+        self.captured = 0
+
+    def create_video_configuration(self, main=None, lores=None, controls=None):
+        config = {"main": dict(main or {"size": (640, 480), "format": "RGB888"}),
+                  "lores": dict(lores) if lores else None,
+                  "controls": dict(controls or {})}
+        config["main"].setdefault("format", "RGB888")
+        return config
+
+    create_still_configuration = create_video_configuration
+
+    def align_configuration(self, config):
+        # The ISP wants widths in multiples of 32 (16 for lores)
+        for name, align in (("main", 32), ("lores", 16)):
+            if config.get(name):
+                w, h = config[name]["size"]
+                config[name]["size"] = (max(align, w - w % align), h - h % 2)
+
+    def configure(self, config):
+        self.config = config
+        limits = config["controls"].get("FrameDurationLimits")
+        if limits:
+            self._frame_time = limits[0] / 1_000_000
+        self._sized.clear()
+
+    def start(self):
+        self.started = True
+        self._next = time.monotonic()
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.started = False
+
+    def main_image(self, image):
+        size = self.config["main"]["size"]
+        key = (id(image), size)
+        if key not in self._sized:
+            self._sized[key] = image.resize(size)
+        return self._sized[key]
+
+    def capture_request(self):
+        if not self.started:
+            raise RuntimeError("camera not started")
+        with self._lock:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + self._frame_time, time.monotonic())
+            image = self.frames[self._index % len(self.frames)]
+            self._index += 1
+            self.captured += 1
+        return FakeRequest(self, image)
+
+
+def install(frames_dir=None):
+    """Register the fake as the `picamera2` module"""
+    FakePicamera2.frames = load_frames(frames_dir) if frames_dir else synthetic_frames()
+    module = types.ModuleType("picamera2")
+    module.Picamera2 = FakePicamera2
+    sys.modules["picamera2"] = module
+    return FakePicamera2
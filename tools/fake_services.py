@@ -0,0 +1,245 @@
+"""
+Therapy Robot - Local stand-ins for OpenRouter and ElevenLabs
+
+One threaded HTTP server on localhost that answers:
+
+  GET  /api/v1/auth/key                   (OpenRouter warm-up / keepalive)
+  POST /api/v1/chat/completions           (OpenRouter, streaming or not)
+  POST /v1/text-to-speech/<voice>[/stream] (ElevenLabs; MP3, or raw PCM
+                                            with ?output_format=pcm_<rate>)
+
+Latencies come from configurable distributions (per model for the chat
+API) so benchmarks can reproduce slow tails, hedging and errors without
+API keys. Latency specs look like:
+
+  fixed:0.5            always 0.5 s
+  uniform:0.5:2.0      between 0.5 and 2 s
+  lognormal:1.2:0.4    median 1.2 s, sigma 0.4 (long right tail)
+"""
+
+import array
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_AUDIO = os.path.join(ROOT, "67_emote.mp3")
+
+CANNED_RESPONSES = [
+    "You look like you argue with the self-checkout machine and lose. "
+    "That haircut looks like it was a dare you couldn't back out of.",
+    "You've got the energy of someone who replies-all to company emails. "
+    "Honestly, the confidence is impressive.",
+    "You look like you're doing your best today, and that's enough. "
+    "Take a deep breath, you deserve a little kindness.",
+    "That sweater is giving cozy energy. "
+    "Be gentle with yourself tonight, you're doing better than you think.",
+]
+
+
+class Latency:
+    """A latency distribution parsed from a spec string"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, *args = spec.split(":")
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency spec {spec!r}")
+
+    def sample(self, rng=random):
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.args)
+        median, sigma = self.args
+        return median * math.exp(rng.gauss(0, sigma))
+
+    def __str__(self):
+        return self.spec
+
+
+class ServiceConfig:
+    def __init__(self, ttft="lognormal:1.2:0.4", token_interval=0.03, error_rate=0.0,
+                 model_ttft=None, tts_first_byte="lognormal:0.35:0.3",
+                 tts_bytes_per_second=64000, tts_realtime_factor=3.0, audio_file=DEFAULT_AUDIO):
+        self.ttft = Latency(ttft)                 # request to first token
+        self.model_ttft = {m: Latency(s) for m, s in (model_ttft or {}).items()}
+        self.token_interval = token_interval      # seconds per streamed word
+        self.error_rate = error_rate              # chance of a 500
+        self.tts_first_byte = Latency(tts_first_byte)
+        self.tts_bytes_per_second = tts_bytes_per_second   # MP3 generation speed
+        self.tts_realtime_factor = tts_realtime_factor     # PCM: x faster than playback
+        with open(audio_file, "rb") as f:
+            self.audio = f.read()
+
+    def ttft_for(self, model):
+        return self.model_ttft.get(model, self.ttft)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real APIs
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ---------- helpers ----------
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # ---------- routes ----------
+
+    def do_GET(self):
+        if self.path.startswith("/api/v1/auth/key"):
+            self._send_json(200, {"data": {"label": "bench"}})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            if self.path.startswith("/api/v1/chat/completions"):
+                self.chat(self._body())
+            elif self.path.startswith("/v1/text-to-speech/"):
+                url = urlparse(self.path)
+                output_format = parse_qs(url.query).get("output_format", ["mp3"])[0]
+                self.tts(self._body(), url.path.rstrip("/").endswith("/stream"), output_format)
+            else:
+                self._send_json(404, {"error": "not found"})
+        except (BrokenPipeError, ConnectionResetError):
+            # A hedged loser or cancelled job hung up on us
+            self.server.stats_add("hangups")
+            self.close_connection = True
+
+    def chat(self, request):
+        config = self.server.config
+        model = request.get("model", "?")
+        self.server.stats_add(f"chat {model}")
+        delay = config.ttft_for(model).sample()
+        time.sleep(delay)
+
+        if random.random() < config.error_rate:
+            self.server.stats_add("chat errors")
+            self._send_json(500, {"error": {"message": "upstream error (simulated)"}})
+            return
+
+        text = random.choice(CANNED_RESPONSES)
+        if not request.get("stream"):
+            time.sleep(config.token_interval * len(text.split()))
+            self._send_json(200, {
+                "model": model,
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 300, "completion_tokens": len(text.split())},
+            })
+            return
+
+        self._start_chunked("text/event-stream")
+        self._chunk(b": OPENROUTER PROCESSING\n\n")
+        for i, word in enumerate(text.split(" ")):
+            if i:
+                time.sleep(config.token_interval)
+            delta = {"choices": [{"delta": {"content": word if i == 0 else " " + word}}]}
+            self._chunk(f"data: {json.dumps(delta)}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def tts(self, request, streaming, output_format="mp3"):
+        config = self.server.config
+        self.server.stats_add("tts stream" if streaming else "tts")
+        time.sleep(config.tts_first_byte.sample())
+
+        chunk_size = 4096
+        if output_format.startswith("pcm_"):
+            rate = int(output_format[4:])
+            audio = pcm_speech(request.get("text", ""), rate)
+            bytes_per_second = rate * 2 * config.tts_realtime_factor
+            content_type = "audio/pcm"
+        else:
+            audio = config.audio
+            bytes_per_second = config.tts_bytes_per_second
+            content_type = "audio/mpeg"
+
+        # Audio is "generated" at bytes_per_second; send it as it's made
+        self._start_chunked(content_type)
+        for start in range(0, len(audio), chunk_size):
+            if start:
+                time.sleep(chunk_size / bytes_per_second)
+            self._chunk(audio[start:start + chunk_size])
+        self._end_chunked()
+
+
+def pcm_speech(text, rate, chars_per_second=15):
+    """16-bit mono PCM as long as `text` would take to say: a quiet hum"""
+    seconds = max(0.5, len(text) / chars_per_second)
+    samples = array.array("h", (int(2000 * math.sin(2 * math.pi * 180 * i / rate))
+                                for i in range(int(seconds * rate))))
+    return samples.tobytes()
+
+
+class FakeServices(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config=None, port=0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.config = config or ServiceConfig()
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def stats_add(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_model_latencies(items):
+    """["model=spec", ...] -> {model: spec}"""
+    result = {}
+    for item in items or []:
+        match = re.match(r"(.+?)=(.+)", item)
+        if not match:
+            raise ValueError(f"expected model=spec, got {item!r}")
+        result[match.group(1)] = match.group(2)
+    return result
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - Link compression benchmark
+
+Encodes a set of responses with each link_protocol compression option
+and reports, per message: bytes on the wire, ratio against plain
+frames, fragments, UART airtime at 115200 baud, and encode/decode time.
+
+Uses the Pi's response log when there is one, otherwise a few sample
+responses.
+
+Run:
+  python3 tools/link_compress_bench.py
+  python3 tools/link_compress_bench.py robot/responses.jsonl --repeat 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import link_protocol
+from build_link_dict import load_texts
+
+BAUD_RATE = 115200
+RESPONSE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "robot", "responses.jsonl")
+
+SAMPLE_RESPONSES = [
+    "You look like you're doing your best today, and honestly that's enough.",
+    "Take a deep breath. Your smile says you're stronger than you feel right now.",
+    "That sweater is giving cozy energy, and you deserve that kind of comfort.",
+    "I can see you're carrying a lot, but you don't have to carry it alone.",
+    "It's okay to slow down. You're here, you showed up, and that matters.",
+    "Your eyes look tired but kind. Be gentle with yourself tonight.",
+    "You look like you argue with the self-checkout machine and lose.",
+    "That haircut looks like it was a dare you couldn't back out of.",
+    "You've got the energy of someone who replies-all to company emails.",
+    "Your outfit says 'first day at a job I'll quit by lunch.'",
+    "You look like the kind of person who claps when the plane lands. 😂",
+    "Those glasses are working overtime to make you look smart, and they're losing. 🔥",
+    "Honestly, your confidence is impressive for someone dressed like a beige cardigan.",
+    "You look like you'd bring a kazoo to a job interview and still think it went well.",
+]
+
+
+def bench(texts, compressor, repeat):
+    encoder = link_protocol.Encoder(compressor=compressor)
+    frames_per_text = [encoder.encode(text) for text in texts]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            encoder.encode(text)
+    encode_us = (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+    # Decode through a fresh Reassembler each round (IDs repeat otherwise)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        reassembler = link_protocol.Reassembler(compressor=compressor)
+        for frames in frames_per_text:
+            for frame in frames:
+                reassembler.feed(frame)
+    decode_us = (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+    wire = [sum(len(f) + 1 for f in frames) for frames in frames_per_text]
+    return {
+        "bytes": statistics.mean(wire),
+        "fragments": statistics.mean(len(frames) for frames in frames_per_text),
+        "multi": sum(1 for frames in frames_per_text if len(frames) > 1),
+        "encode_us": encode_us,
+        "decode_us": decode_us,
+        "total": sum(wire),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark link compression")
+    parser.add_argument("inputs", nargs="*", help="JSONL or text files of responses")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    inputs = args.inputs or ([RESPONSE_LOG] if os.path.exists(RESPONSE_LOG) else [])
+    texts = load_texts(inputs) if inputs else SAMPLE_RESPONSES
+    raw = statistics.mean(len(t.encode("utf-8")) for t in texts)
+    print(f"{len(texts)} responses, {raw:.0f} bytes of text on average\n")
+
+    options = [
+        ("plain frames", None),
+        ("deflate, no dictionary", link_protocol.Compressor(b"")),
+        ("built-in dictionary", link_protocol.Compressor()),
+    ]
+    if os.path.exists(link_protocol.DICT_FILE):
+        with open(link_protocol.DICT_FILE, "rb") as f:
+            options.append(("link_dict.bin", link_protocol.Compressor(f.read())))
+
+    baseline = None
+    print(f"{'':<24}{'bytes/msg':>10}{'ratio':>8}{'frags':>7}{'multi':>7}"
+          f"{'airtime':>10}{'encode':>10}{'decode':>10}")
+    for name, compressor in options:
+        r = bench(texts, compressor, args.repeat)
+        baseline = baseline or r["total"]
+        airtime_ms = r["bytes"] * 10 / BAUD_RATE * 1000
+        print(f"{name:<24}{r['bytes']:>10.1f}{r['total'] / baseline:>8.0%}"
+              f"{r['fragments']:>7.2f}{r['multi']:>7}{airtime_ms:>8.2f}ms"
+              f"{r['encode_us']:>8.1f}us{r['decode_us']:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
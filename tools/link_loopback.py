@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - Link protocol loopback check
+
+Reference check for link_protocol over a real pty pair (no hardware):
+the "Pi" end writes framed messages, the "laptop" end reads them with
+serial_lines.LineReader and sorts them with Reassembler.route(), as the
+laptop scripts' handle_line() does. Long responses with emoji are
+fragmented, some fragments are duplicated, some have a fragment boundary
+next to a space (lost if anything strips the line), some span several
+lines (CR/LF must arrive as spaces, not split the frame) and one message
+loses a fragment to exercise the timeout.
+
+Run:
+  python3 tools/link_loopback.py
+"""
+
+import os
+import pty
+import random
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serial
+
+import link_protocol
+from serial_lines import LineReader
+
+SAMPLE_WORDS = ("roast", "café", "🔥", "beige", "cardigan", "energy", "😂",
+                "haircut", "confidence", "naïve", "sweater", "vibes")
+
+
+def random_text(rng, length):
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(rng.choice(SAMPLE_WORDS))
+    return " ".join(words)
+
+
+def boundary_texts(rng):
+    """Messages with a space at the end or start of a fragment"""
+    size = link_protocol.MAX_PAYLOAD_BYTES
+    texts = []
+    for offset in (-2, -1, 0, 1):
+        # Fragment 0 ends (or fragment 1 starts) on the space
+        head = "x" * (size + offset)
+        texts.append(head + " " + random_text(rng, 100))
+    texts.append("x" * (size - 3) + "   " + "y" * size + " " + random_text(rng, 50))
+    texts.append(" leading and trailing spaces " + "z" * size + " ")
+    return texts
+
+
+def multiline_texts(rng):
+    """Messages with CR/LF inside, short and fragmented"""
+    return [
+        "Line one.\nLine two.",
+        "Windows line.\r\nMac line.\rLast line.\n",
+        random_text(rng, 200) + "\n" + random_text(rng, 300) + "\r\n" + random_text(rng, 50),
+    ]
+
+
+def main():
+    rng = random.Random(67)
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    laptop = serial.Serial(os.ttyname(slave), 115200, timeout=0.5)
+
+    encoder = link_protocol.Encoder()
+    reassembler = link_protocol.Reassembler(timeout=0.5)
+
+    messages = [random_text(rng, n) for n in (20, 150, 243, 244, 400, 900, 1500)]
+    messages += [random_text(rng, rng.randint(10, 700)) for _ in range(40)]
+    messages += boundary_texts(rng)
+    messages += multiline_texts(rng)
+    expected = {}
+    lost_id = None
+
+    lines = [b"ESP32 debug line\r", b"  EMOTE 67 DONE  ", b""]
+    for i, text in enumerate(messages):
+        msg_id = encoder.next_id()
+        frames = encoder.encode(text, msg_id=msg_id)
+        assert all(len(f) <= link_protocol.MAX_LINE_BYTES for f in frames), "frame too long"
+
+        if i == 5 and len(frames) > 1:
+            # Lose one fragment: this message must time out, not arrive garbled
+            lost_id = msg_id
+            frames = frames[:-1]
+        else:
+            expected[msg_id] = link_protocol.one_line(text)
+        for frame in frames:
+            lines.append(frame)
+            if rng.random() < 0.1:
+                lines.append(frame)  # duplicate delivery
+
+    def pi_side():
+        for line in lines:
+            os.write(master, line + b"\n")
+            time.sleep(0.0005)
+
+    writer = threading.Thread(target=pi_side)
+    start = time.monotonic()
+    writer.start()
+
+    reader = LineReader(laptop)
+    received = {}
+    passthrough = []
+    deadline = time.monotonic() + 10
+    while len(received) < len(expected) and time.monotonic() < deadline:
+        for line in reader.read_lines(timeout=0.2):
+            completed, text = reassembler.route(line)
+            for msg in completed:
+                received[msg.id] = msg.text
+            if text:
+                passthrough.append(text)
+    writer.join()
+    elapsed = time.monotonic() - start
+
+    time.sleep(0.6)
+    reassembler.expire()
+
+    failures = []
+    try:
+        encoder.encode("x" * (link_protocol.MAX_PAYLOAD_BYTES * link_protocol.MAX_FRAGMENTS + 1))
+        failures.append("oversized message")
+    except link_protocol.MessageTooLong:
+        pass
+    for msg_id, text in expected.items():
+        if received.get(msg_id) != text:
+            failures.append(msg_id)
+    if lost_id is not None and lost_id in received:
+        failures.append(lost_id)
+    if passthrough != ["ESP32 debug line", "EMOTE 67 DONE"]:
+        failures.append("passthrough")
+
+    stats = reassembler.stats()
+    print(f"{len(lines)} lines, {len(expected)} messages in {elapsed * 1000:.0f} ms")
+    print(f"Reassembler: {stats}")
+    if failures or stats["timed_out"] != (1 if lost_id is not None else 0):
+        print(f"FAIL: {failures}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - Serial session replayer
+
+Feeds a session log (recorded with RECORD_SESSION in the laptop scripts)
+back through a pty into a laptop controller's handle_line(), byte for
+byte with the original timing, scaled, or as fast as possible. Use it to
+reproduce venue incidents or to hammer the line handling and audio queue
+with many times real traffic.
+
+Targets:
+  lines                      LineReader + link_protocol reassembly only
+  laptop_audio_67            the full controller; TTS goes to the local
+  laptop_audio_elevenlabs    stand-in from tools/fake_services.py
+  laptop_audio               (pyttsx3, speaks for real)
+
+Run:
+  python3 tools/replay_session.py sessions/session-20250301-201500.bin
+  python3 tools/replay_session.py session.bin --speed 20 --target lines
+  python3 tools/replay_session.py session.bin --speed 0 --target laptop_audio_67 --wait-audio
+"""
+
+import argparse
+import importlib
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS))
+
+import serial
+
+import link_protocol
+import serial_record
+from serial_lines import LineReader
+
+TARGETS = ("lines", "laptop_audio_67", "laptop_audio_elevenlabs", "laptop_audio")
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Player:
+    """Writes the recorded chunks into the pty on schedule"""
+
+    def __init__(self, records, master, speed):
+        self.records = records
+        self.master = master
+        self.speed = speed      # 0 = as fast as possible
+        self.max_lag = 0.0
+        self.done = threading.Event()
+
+    def run(self):
+        start = time.monotonic()
+        first = self.records[0][0]   # skip the idle time before the first byte
+        for offset, data in self.records:
+            if self.speed:
+                due = start + (offset - first) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            os.write(self.master, data)   # blocks if the reader falls behind
+        self.done.set()
+
+
+def load_target(name, args):
+    """Return (handle_line, queue or None)"""
+    if name == "lines":
+        reassembler = link_protocol.Reassembler(compressor=link_protocol.load_compressor())
+
+        def handle_line(line):
+            reassembler.route(line)
+
+        handle_line.stats = reassembler.stats
+        return handle_line, None
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        laptop = importlib.import_module(name)
+    except ImportError as e:
+        print(f"Can't load {name}: {e}  (try --target lines)")
+        sys.exit(1)
+
+    laptop.TRACING = False
+    tts = getattr(laptop, "elevenlabs_tts", None)
+    if tts:
+        import fake_services
+        tts.TTS_CACHE = False   # keep the stand-in's audio out of the real cache
+        services = fake_services.FakeServices(fake_services.ServiceConfig(
+            tts_first_byte=args.tts_first_byte)).start()
+        tts.ELEVENLABS_URL = services.url + "/v1/text-to-speech"
+        tts.ELEVENLABS_API_KEY = "replay"
+    if hasattr(laptop, "EMOTE_67_AUDIO"):
+        laptop.EMOTE_67_AUDIO = os.path.join(os.path.dirname(TOOLS), "67_emote.mp3")
+
+    if hasattr(laptop, "init_audio"):
+        laptop.init_audio()
+        return laptop.handle_line, laptop.audio_queue
+    laptop.init_tts()
+    return laptop.handle_line, laptop.speech_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded serial session")
+    parser.add_argument("log", help="session log from RECORD_SESSION")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 = real time, 10 = ten times faster, 0 = as fast as possible")
+    parser.add_argument("--target", choices=TARGETS, default="lines")
+    parser.add_argument("--tts-first-byte", default="lognormal:0.35:0.3",
+                        help="latency of the local TTS stand-in")
+    parser.add_argument("--wait-audio", action="store_true",
+                        help="wait for the audio queue to empty before reporting")
+    args = parser.parse_args()
+
+    records = list(serial_record.read_session(args.log))
+    if not records:
+        print("Empty session")
+        return
+    recorded = records[-1][0] - records[0][0]
+    total_bytes = sum(len(data) for _, data in records)
+    print(f"{len(records)} reads, {total_bytes} bytes over {recorded:.1f} s")
+
+    handle_line, audio_queue = load_target(args.target, args)
+
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    ser = serial.Serial(os.ttyname(slave), 115200, timeout=0.5)
+    reader = LineReader(ser)
+
+    player = Player(records, master, args.speed)
+    start = time.monotonic()
+    threading.Thread(target=player.run, daemon=True).start()
+
+    handle_times = []
+    max_depth = 0
+    quiet_since = None
+    last_line = start
+    while True:
+        lines = reader.read_lines(timeout=0.2)
+        for line in lines:
+            t0 = time.perf_counter()
+            handle_line(line)
+            handle_times.append(time.perf_counter() - t0)
+            if audio_queue is not None:
+                max_depth = max(max_depth, audio_queue.qsize())
+        if lines:
+            last_line = time.monotonic()
+            quiet_since = None
+        elif player.done.is_set():
+            quiet_since = quiet_since or time.monotonic()
+            if time.monotonic() - quiet_since > 0.5:
+                break
+    replayed = last_line - start
+
+    left = audio_queue.qsize() if audio_queue is not None else 0
+    if args.wait_audio and audio_queue is not None:
+        print("Waiting for the audio queue...")
+        audio_queue.join()
+    drained = time.monotonic() - start
+
+    print(f"\nReplayed in {replayed:.2f} s ({recorded / max(replayed, 1e-6):.1f}x real time), "
+          f"max schedule lag {player.max_lag * 1000:.0f} ms")
+    if handle_times:
+        us = [t * 1e6 for t in handle_times]
+        print(f"handle_line: {len(us)} lines, p50 {percentile(us, 50):.0f} us, "
+              f"p99 {percentile(us, 99):.0f} us, max {max(us):.0f} us")
+    if audio_queue is not None:
+        print(f"Audio queue: max depth {max_depth}, {left} left when input ended")
+        if hasattr(audio_queue, "stats"):
+            print(f"Audio scheduler: {audio_queue.stats}")
+        if args.wait_audio:
+            print(f"All audio done after {drained:.1f} s")
+    if hasattr(handle_line, "stats"):
+        print(f"Link: {handle_line.stats()}")
+    os._exit(0)   # audio worker threads don't exit on their own
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Therapy Robot - ROAST trace report
+
+Merges the Pi's and the laptop's trace logs by trace ID and prints
+p50/p95/p99 per pipeline stage, so you can see where the time between
+a button press and speech goes.
+
+A streamed response reaches the laptop as several messages that share
+one trace ID; the merged trace keeps the earliest stamp of each stage
+(and the latest playback_end / last_token).
+
+Run:
+  python3 tools/trace_report.py
+  python3 tools/trace_report.py robot/trace_pi.jsonl trace_laptop.jsonl --source ai
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tracing
+
+LATEST_STAGES = ("last_token", "playback_end")
+
+# (label, from stage, to stage)
+SEGMENTS = [
+    ("capture", "received", "capture"),
+    ("encode", "capture", "encode"),
+    ("request sent", "encode", "upload"),
+    ("first token", "upload", "first_token"),
+    ("generation", "first_token", "last_token"),
+    ("to UART", "first_token", "uart_write"),
+    ("link", "uart_write", "receive"),
+    ("TTS queue", "receive", "tts_request"),
+    ("TTS first byte", "tts_request", "first_audio_byte"),
+    ("audio start", "first_audio_byte", "playback_start"),
+    ("speech", "playback_start", "playback_end"),
+    ("PRESS TO UART", "received", "uart_write"),
+    ("PRESS TO AUDIO", "received", "playback_start"),
+    ("PRESS TO DONE", "received", "playback_end"),
+]
+
+
+def load(path):
+    records = []
+    if not os.path.exists(path):
+        print(f"(no {path})")
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def merge(records):
+    """trace ID -> {"stages": {...}, "info": {...}}"""
+    traces = collections.defaultdict(lambda: {"stages": {}, "info": {}})
+    for record in records:
+        merged = traces[record["trace"]]
+        for stage, when in record.get("stages", {}).items():
+            current = merged["stages"].get(stage)
+            if current is None:
+                merged["stages"][stage] = when
+            elif stage in LATEST_STAGES:
+                merged["stages"][stage] = max(current, when)
+            else:
+                merged["stages"][stage] = min(current, when)
+        for key, value in record.items():
+            if key not in ("trace", "side", "stages"):
+                merged["info"].setdefault(key, value)
+    return traces
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage ROAST latency from trace logs")
+    parser.add_argument("pi_log", nargs="?", default=os.path.join(ROOT, "robot", "trace_pi.jsonl"))
+    parser.add_argument("laptop_log", nargs="?", default=os.path.join(ROOT, "trace_laptop.jsonl"))
+    parser.add_argument("--source", help="only traces answered this way (ai, cached, prefetched, rejected)")
+    parser.add_argument("--model", help="only traces answered by this model")
+    args = parser.parse_args()
+
+    traces = merge(load(args.pi_log) + load(args.laptop_log))
+    if args.source:
+        traces = {k: v for k, v in traces.items() if v["info"].get("source") == args.source}
+    if args.model:
+        traces = {k: v for k, v in traces.items() if v["info"].get("model") == args.model}
+    if not traces:
+        print("No traces")
+        return
+
+    both = sum(1 for t in traces.values()
+               if "received" in t["stages"] and "receive" in t["stages"])
+    print(f"{len(traces)} traces, {both} seen on both sides\n")
+
+    print(f"{'stage':<18}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for label, start, end in SEGMENTS:
+        values = [(t["stages"][end] - t["stages"][start]) * 1000
+                  for t in traces.values()
+                  if start in t["stages"] and end in t["stages"]]
+        if not values:
+            continue
+        print(f"{label:<18}{len(values):>6}{percentile(values, 50):>8.0f}ms"
+              f"{percentile(values, 95):>8.0f}ms{percentile(values, 99):>8.0f}ms")
+
+    missing = [s for s in tracing.STAGES
+               if not any(s in t["stages"] for t in traces.values())]
+    if missing:
+        print(f"\nNever stamped: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
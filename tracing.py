@@ -0,0 +1,82 @@
+"""
+Therapy Robot - ROAST traces
+
+A trace ID is created when the Pi receives ROAST and travels with the
+response over the link (link_protocol TYPE_TRACED frames), so both sides
+can stamp the stages they see and append them to a JSONL file.
+tools/trace_report.py merges the two files by trace ID.
+
+Stamps are wall-clock (time.time()) so the Pi and laptop logs can be
+compared; keep both clocks NTP-synced or the link stage will be off by
+the skew.
+"""
+
+import json
+import random
+import threading
+import time
+
+# Pipeline order, Pi first then laptop
+STAGES = (
+    "received",          # Pi got ROAST
+    "capture",           # frame selected
+    "encode",            # crop + JPEG + base64 done
+    "upload",            # request sent to the AI
+    "first_token",
+    "last_token",
+    "uart_write",        # first line written to the ESP32
+    "receive",           # laptop has the (first) message
+    "tts_request",
+    "first_audio_byte",
+    "playback_start",
+    "playback_end",
+)
+
+
+def new_trace_id():
+    return f"{random.getrandbits(32):08x}"
+
+
+class Trace:
+    """Stage timestamps for one ROAST as seen by one side"""
+
+    def __init__(self, trace_id=None, side="pi", start=None):
+        self.id = trace_id or new_trace_id()
+        self.side = side
+        self.stages = {}
+        self.info = {}
+        if start is not None:
+            self.stages[STAGES[0]] = start
+
+    def mark(self, stage, when=None):
+        """Stamp a stage; the first stamp wins (hedged attempts race)"""
+        if stage not in self.stages:
+            self.stages[stage] = time.time() if when is None else when
+
+    def since(self, stage):
+        """Seconds from `stage` to now, or None if it wasn't stamped"""
+        start = self.stages.get(stage)
+        return None if start is None else time.time() - start
+
+    def record(self):
+        record = {"trace": self.id, "side": self.side,
+                  "stages": {k: round(v, 4) for k, v in self.stages.items()}}
+        record.update(self.info)
+        return record
+
+
+class TraceLog:
+    """Appends trace records to a JSONL file; safe to share between threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, trace):
+        line = json.dumps(trace.record()) + "\n"
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Could not write trace: {e}")
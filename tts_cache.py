@@ -0,0 +1,147 @@
+"""
+Therapy Robot - Persistent TTS audio cache
+
+Status lines ("Robot audio ready", "Switched to evil mode") and recurring
+roast phrases are spoken over and over; each costs a full ElevenLabs
+round trip. This cache keeps the audio on disk, content-addressed by a
+hash of everything that changes the sound: the normalised text, voice,
+model, voice settings and output format.
+
+Files are written to a temp name and renamed into place, so a crash
+never leaves a half-written clip behind. An in-memory index (key ->
+size, in LRU order) is built from the directory at startup; file mtimes
+carry the LRU order across restarts. When the total size passes
+max_bytes the least recently used clips are deleted.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+
+SUFFIX = ".audio"
+TEMP_SUFFIX = ".tmp"
+
+
+def normalize_text(text):
+    """Same words, same audio: unify Unicode forms and collapse whitespace"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, voice_id, model_id, stability, similarity_boost, output_format):
+    """Hex SHA-256 over everything that affects the generated audio"""
+    material = json.dumps([normalize_text(text), voice_id, model_id,
+                           stability, similarity_boost, output_format])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Size-capped LRU cache of audio clips in one directory"""
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._entries = collections.OrderedDict()  # key -> size, LRU order
+        self._total = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def _load_index(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(TEMP_SUFFIX):
+                # Left over from a crash mid-write
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            elif name.endswith(SUFFIX):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name[:-len(SUFFIX)], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            self.evicted += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        """Return the cached clip for `key`, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)   # keep the LRU order across restarts
+            except OSError:
+                # Deleted behind our back
+                self._total -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += len(data)
+            return data
+
+    def put(self, key, data):
+        """Store a clip atomically, evicting old clips past max_bytes"""
+        if not data or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            path = self._path(key)
+            temp_path = f"{path}.{os.getpid()}{TEMP_SUFFIX}"
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"TTS cache write failed: {e}")
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+                return
+            self._total -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evicted": self.evicted,
+        }
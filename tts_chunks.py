@@ -0,0 +1,86 @@
+"""
+Therapy Robot - Sentence-chunked TTS
+
+A long response sent to ElevenLabs as one request takes longer to start
+speaking the longer it is. Here the response is split into sentences
+that are synthesised concurrently on a shared, bounded thread pool, and
+played back strictly in order: each sentence has its own ChunkPrefetcher
+slot, so whichever finishes first simply waits its turn (the reorder
+buffer), while the first sentence can start playing on its first bytes.
+"""
+
+import re
+import time
+
+from tts_stream import ChunkPrefetcher
+
+SPLIT_PATTERN = r"(?<=[.!?…])\s+"
+MIN_CHARS = 40
+
+
+def split_sentences(text, pattern=SPLIT_PATTERN, min_chars=MIN_CHARS):
+    """
+    Split text at sentence ends. Pieces shorter than min_chars are merged
+    with the next one (or the last one), since very short requests sound
+    choppy and cost a round trip each.
+    """
+    pieces = [p.strip() for p in re.split(pattern, text.strip()) if p.strip()]
+    chunks = []
+    current = ""
+    for piece in pieces:
+        current = f"{current} {piece}" if current else piece
+        if len(current) >= min_chars:
+            chunks.append(current)
+            current = ""
+    if current:
+        if chunks and len(current) < min_chars:
+            chunks[-1] = f"{chunks[-1]} {current}"
+        else:
+            chunks.append(current)
+    return chunks
+
+
+class ChunkedSynthesis:
+    """
+    One utterance, synthesised sentence by sentence on `pool`.
+
+    fetch(index, text) must return an iterable of audio chunks for one
+    sentence; it is consumed on a pool thread, so it can block on the
+    network. Sentences are submitted in order, so the first one is never
+    stuck behind later ones.
+    """
+
+    def __init__(self, sentences, fetch, pool, trace=None):
+        self.start = time.monotonic()
+        self.sentences = sentences
+        self.parts = []
+        for index, text in enumerate(sentences):
+            # Only the first sentence stamps first_audio_byte on the trace
+            part = ChunkPrefetcher(trace=trace if index == 0 else None)
+            self.parts.append(part)
+            pool.submit(part.download, fetch(index, text))
+
+    def chunks(self):
+        """All audio in sentence order; a sentence that fails is skipped"""
+        for index, part in enumerate(self.parts):
+            try:
+                yield from part.chunks()
+            except Exception as e:
+                print(f"   TTS sentence {index + 1} failed: {e}")
+
+    def __iter__(self):
+        """Each sentence's ChunkPrefetcher in order"""
+        return iter(self.parts)
+
+    def timings(self):
+        """Per sentence: length, and ms from the start to first and last byte"""
+        def ms(when):
+            return round((when - self.start) * 1000) if when is not None else None
+
+        return [{"chars": len(text), "first_byte_ms": ms(part.first_chunk_at),
+                 "done_ms": ms(part.done_at), "ok": part.complete}
+                for text, part in zip(self.sentences, self.parts)]
+
+    def summary(self):
+        return " | ".join(f"{t['chars']}ch {t['first_byte_ms']}/{t['done_ms']} ms"
+                          for t in self.timings())
@@ -0,0 +1,216 @@
+"""
+Therapy Robot - Streaming TTS playback
+
+Plays raw PCM from the ElevenLabs streaming endpoint while it is still
+downloading, instead of waiting for the whole MP3. A download thread
+fills a buffer; playback starts once JITTER_MS of audio is buffered and
+feeds fixed-size blocks to the speech channel (playback.ChannelPlayer),
+which keeps one block queued behind the one playing so there is no gap
+between blocks.
+
+If the network falls behind (an underrun: the channel runs dry before
+the stream has ended) playback pauses and re-buffers JITTER_MS before
+carrying on, rather than stuttering block by block.
+
+ChunkPrefetcher downloads a stream on its own thread, so the next
+utterance can be fetched while the current one plays (audio_pipeline.py).
+
+The mixer must be initialised at the stream's sample rate, 16-bit mono.
+"""
+
+import threading
+import time
+
+import pygame
+
+import playback
+
+SAMPLE_WIDTH = 2          # 16-bit PCM
+JITTER_MS = 250           # audio buffered before playback (re)starts
+BLOCK_MS = 100            # audio per Sound handed to the mixer
+
+
+class StreamStats:
+    __slots__ = ("bytes", "underruns", "first_byte", "started", "finished", "error")
+
+    def __init__(self):
+        self.bytes = 0
+        self.underruns = 0
+        self.first_byte = None   # seconds from play() to the first chunk
+        self.started = None      # seconds from play() to audio start
+        self.finished = None
+        self.error = None
+
+    def __str__(self):
+        first = f"{self.first_byte * 1000:.0f}" if self.first_byte is not None else "-"
+        start = f"{self.started * 1000:.0f}" if self.started is not None else "-"
+        return (f"first byte {first} ms, audio start {start} ms, "
+                f"{self.bytes // 1024} KB, {self.underruns} underruns")
+
+
+class ChunkPrefetcher:
+    """
+    Downloads an iterator of chunks ahead of playback, so an utterance
+    can be fetched while the one before it is still playing. chunks()
+    replays everything received so far and then follows the download.
+
+    Given `chunks`, it downloads on its own thread; otherwise call
+    download() from a thread of your own (e.g. a pool worker).
+    """
+
+    def __init__(self, chunks=None, trace=None):
+        self.trace = trace
+        self.error = None
+        self.first_chunk_at = None   # time.monotonic() stamps
+        self.done_at = None
+        self._chunks = []
+        self._done = False
+        self._cond = threading.Condition()
+        if chunks is not None:
+            threading.Thread(target=self.download, args=(chunks,), daemon=True).start()
+
+    def download(self, chunks):
+        """Pull `chunks` to the end, recording any error"""
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                with self._cond:
+                    if not self._chunks:
+                        self.first_chunk_at = time.monotonic()
+                        if self.trace:
+                            self.trace.mark("first_audio_byte")
+                    self._chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self._done = True
+                self.done_at = time.monotonic()
+                self._cond.notify_all()
+
+    def chunks(self):
+        """Yield every chunk in order; raises the download error, if any, at the end"""
+        i = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._done or len(self._chunks) > i)
+                if i < len(self._chunks):
+                    chunk = self._chunks[i]
+                else:
+                    if self.error:
+                        raise self.error
+                    return
+            i += 1
+            yield chunk
+
+    def wait(self):
+        """Block until the download has finished (or failed)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._done)
+
+    @property
+    def complete(self):
+        """True once the whole stream has arrived without errors"""
+        return self._done and self.error is None
+
+    def data(self):
+        with self._cond:
+            return b"".join(self._chunks)
+
+
+class PCMStreamPlayer:
+    """Plays an iterator of PCM chunks through a playback.ChannelPlayer as it arrives"""
+
+    def __init__(self, sample_rate, output, jitter_ms=JITTER_MS, block_ms=BLOCK_MS):
+        self.sample_rate = sample_rate
+        self.output = output
+        bytes_per_ms = sample_rate * SAMPLE_WIDTH / 1000
+        self.jitter_bytes = int(bytes_per_ms * jitter_ms) // SAMPLE_WIDTH * SAMPLE_WIDTH
+        self.block_bytes = int(bytes_per_ms * block_ms) // SAMPLE_WIDTH * SAMPLE_WIDTH
+
+    def play(self, chunks, trace=None, cancelled=None, lead=0.0):
+        """
+        Download and play `chunks`; blocks until playback ends, or until
+        `lead` seconds before so the next clip can be queued gaplessly
+        behind it. Returns StreamStats.
+        """
+        stats = StreamStats()
+        buffer = bytearray()
+        cond = threading.Condition()
+        done = [False]
+        start = time.monotonic()
+
+        def download():
+            try:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    with cond:
+                        if stats.first_byte is None:
+                            stats.first_byte = time.monotonic() - start
+                            if trace:
+                                trace.mark("first_audio_byte")
+                        buffer.extend(chunk)
+                        stats.bytes += len(chunk)
+                        cond.notify()
+                    if cancelled is not None and cancelled.is_set():
+                        break
+            except Exception as e:
+                stats.error = e
+            finally:
+                with cond:
+                    done[0] = True
+                    cond.notify()
+
+        threading.Thread(target=download, daemon=True).start()
+
+        buffering = True
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                self.output.stop()
+                break
+
+            with cond:
+                if buffering:
+                    # (Re)fill the jitter buffer before starting
+                    cond.wait_for(lambda: done[0] or len(buffer) >= self.jitter_bytes, timeout=0.1)
+                    if not (done[0] or len(buffer) >= self.jitter_bytes):
+                        continue
+                    buffering = False
+                else:
+                    # Wake on new audio, or when the channel is about to run dry
+                    cond.wait_for(lambda: done[0] or len(buffer) >= self.block_bytes,
+                                  timeout=max(0.0, self.output.ends_at - time.monotonic()))
+
+                block = None
+                take = self.block_bytes if len(buffer) >= self.block_bytes else 0
+                if done[0] and not take:
+                    take = len(buffer) // SAMPLE_WIDTH * SAMPLE_WIDTH
+                if take:
+                    block = bytes(buffer[:take])
+                    del buffer[:take]
+                finished_download = done[0] and len(buffer) < SAMPLE_WIDTH
+
+            if block is not None:
+                # Blocks (on a timer) while the channel already has one queued
+                started = self.output.submit(pygame.mixer.Sound(buffer=block), cancelled)
+                if started is not None and stats.started is None:
+                    stats.started = started - start
+                    if trace:
+                        trace.mark("playback_start", playback.to_wall(started))
+                continue
+
+            if finished_download:
+                break
+            if self.output.idle():
+                # Ran dry mid-stream: wait for a full jitter buffer again
+                if stats.started is not None:
+                    stats.underruns += 1
+                buffering = True
+
+        if not (cancelled is not None and cancelled.is_set()):
+            self.output.wait(cancelled, lead)
+        stats.finished = time.monotonic() - start
+        return stats